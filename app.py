@@ -1,33 +1,59 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, jsonify, request, send_file, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from jira import JIRA
+from jira.exceptions import JIRAError
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime, timedelta, timezone
 import json
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import io
+import re
+import sys
+import hashlib
+import queue
+import random
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from functools import lru_cache
+from types import SimpleNamespace
+import requests
+from requests.adapters import HTTPAdapter
+import sqlite3
+import zlib
 import pandas as pd
+import openpyxl
 import numpy as np
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Total-Count'])
 
 # Configure Gemini
+GEMINI_MODEL_NAME = 'gemini-2.0-flash'
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel('gemini-2.0-flash')
+model = genai.GenerativeModel(GEMINI_MODEL_NAME)
 
 # Jira configuration
 JIRA_URL = os.getenv('JIRA_URL')
 JIRA_EMAIL = os.getenv('JIRA_EMAIL')
 JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN')
+# Number of Jira clients shared by concurrent requests
+JIRA_POOL_SIZE = int(os.getenv('JIRA_POOL_SIZE', '4'))
+# Seconds a pooled client may sit idle before it is health checked again
+JIRA_POOL_HEALTH_CHECK_SECONDS = float(os.getenv('JIRA_POOL_HEALTH_CHECK_SECONDS', '300'))
+# Seconds a request waits for a free client when the pool is exhausted
+JIRA_POOL_TIMEOUT_SECONDS = float(os.getenv('JIRA_POOL_TIMEOUT_SECONDS', '30'))
 
 def get_jira_client():
     if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
@@ -45,16 +71,416 @@ def get_jira_client():
     except Exception as e:
         raise Exception(f"Failed to connect to Jira: {str(e)}")
 
+class JiraClientPool:
+    """Process-wide pool of authenticated Jira clients with keep-alive sessions.
+
+    Clients are created lazily up to ``size``, handed out to one request at a time,
+    health checked when they have been idle for a while and replaced when they fail.
+    """
+    
+    def __init__(self, size, factory=get_jira_client, health_check_seconds=300, timeout_seconds=30):
+        self.size = size
+        self.factory = factory
+        self.health_check_seconds = health_check_seconds
+        self.timeout_seconds = timeout_seconds
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _create_client(self):
+        jira_client = self.factory()
+        # Keep enough connections alive for the parallel fetch workers sharing this client
+        pool_maxsize = max(JIRA_FETCH_WORKERS, 10)
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        jira_client._session.mount('https://', adapter)
+        jira_client._session.mount('http://', adapter)
+        return jira_client
+    
+    def _is_healthy(self, jira_client):
+        try:
+            jira_client.server_info()
+            return True
+        except Exception as e:
+            print(f"Pooled Jira client failed health check, reconnecting: {str(e)}")
+            return False
+    
+    def _discard(self, jira_client):
+        try:
+            jira_client.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+    
+    def _acquire(self):
+        while True:
+            try:
+                jira_client, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._create_client()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    jira_client, last_used = self._idle.get(timeout=self.timeout_seconds)
+                except queue.Empty:
+                    raise Exception("Timed out waiting for a free Jira connection")
+            
+            if time.monotonic() - last_used < self.health_check_seconds or self._is_healthy(jira_client):
+                return jira_client
+            self._discard(jira_client)
+    
+    def _release(self, jira_client, healthy=True):
+        if healthy:
+            self._idle.put((jira_client, time.monotonic()))
+        else:
+            self._discard(jira_client)
+    
+    @contextmanager
+    def client(self):
+        """Borrow a Jira client for the duration of a with block."""
+        jira_client = self._acquire()
+        healthy = True
+        try:
+            yield jira_client
+        except requests.exceptions.ConnectionError:
+            # Drop clients whose connection broke so the next request reconnects
+            healthy = False
+            raise
+        finally:
+            self._release(jira_client, healthy)
+
+jira_pool = JiraClientPool(
+    JIRA_POOL_SIZE,
+    health_check_seconds=JIRA_POOL_HEALTH_CHECK_SECONDS,
+    timeout_seconds=JIRA_POOL_TIMEOUT_SECONDS
+)
+
+# Directory holding the local on-disk caches
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+# Keys per IN (...) lookup, well below SQLite's bound parameter limit
+SQLITE_BATCH_SIZE = 500
+
+class SqliteCache:
+    """Small on-disk key/value cache with TTL expiry, LRU eviction and a size cap.
+
+    Values are stored as zlib-compressed JSON together with an optional tag (such as a
+    Jira watermark) that callers compare to decide whether an entry is still valid.
+    """
+    
+    def __init__(self, path, ttl_seconds=None, max_bytes=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+    
+    @contextmanager
+    def _connection(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                if not self._initialized:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS entries ('
+                        'key TEXT PRIMARY KEY, tag TEXT, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                        'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+                    )
+                    self._initialized = True
+                yield conn
+        finally:
+            conn.close()
+    
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+    
+    def get(self, key):
+        """Return {'tag', 'value', 'created_at'} for a live entry, or None."""
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute('SELECT tag, value, created_at FROM entries WHERE key = ?', (key,)).fetchone()
+            if row and self._is_expired(row[2], now):
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                row = None
+            if row:
+                conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        self._count(row is not None)
+        if not row:
+            return None
+        return {'tag': row[0], 'value': json.loads(zlib.decompress(row[1])), 'created_at': row[2]}
+    
+    def put(self, key, value, tag=None):
+        """Store a JSON-serializable value and evict entries beyond the TTL or size cap."""
+        blob = zlib.compress(json.dumps(value).encode('utf-8'))
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, tag, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, tag, blob, len(blob), now, now)
+            )
+            self._evict(conn, now)
+    
+    def get_many(self, keys):
+        """Look up many keys in one transaction; returns {key: entry} for the live entries."""
+        now = time.time()
+        found = {}
+        with self._connection() as conn:
+            for i in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[i:i + SQLITE_BATCH_SIZE]
+                placeholders = ', '.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT key, tag, value, created_at FROM entries WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, tag, value, created_at in rows:
+                    if not self._is_expired(created_at, now):
+                        found[key] = (tag, value, created_at)
+            conn.executemany('UPDATE entries SET accessed_at = ? WHERE key = ?', [(now, key) for key in found])
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return {
+            key: {'tag': tag, 'value': json.loads(zlib.decompress(value)), 'created_at': created_at}
+            for key, (tag, value, created_at) in found.items()
+        }
+    
+    def put_many(self, entries):
+        """Store (key, value, tag) triples in one transaction, evicting once at the end."""
+        now = time.time()
+        rows = []
+        for key, value, tag in entries:
+            blob = zlib.compress(json.dumps(value).encode('utf-8'))
+            rows.append((key, tag, blob, len(blob), now, now))
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO entries (key, tag, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._evict(conn, now)
+    
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+    
+    def _evict(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute('DELETE FROM entries WHERE created_at < ?', (now - self.ttl_seconds,))
+        if self.max_bytes is None:
+            return
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under the cap
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed_at ASC').fetchall():
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+    
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        with self._connection() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+# Board and sprint lists behind the selection dropdowns
+BOARD_LIST_TTL_SECONDS = float(os.getenv('BOARD_LIST_TTL_SECONDS', '3600'))
+# How long active and future sprints are served from the cache; closed sprints are kept for good
+SPRINT_LIST_TTL_SECONDS = float(os.getenv('SPRINT_LIST_TTL_SECONDS', '300'))
+# Keep the lists on disk as well so they survive a restart
+JIRA_LIST_CACHE_PERSIST = os.getenv('JIRA_LIST_CACHE_PERSIST', 'false').lower() == 'true'
+
+class MemoryCache:
+    """In-memory key/value cache with the same get/put interface as SqliteCache.
+
+    When a SqliteCache is given as store, entries are written through to it and
+    memory misses fall back to it. Freshness is left to the caller via 'created_at'.
+    """
+    
+    def __init__(self, store=None):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return {'value', 'created_at'} for a cached entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            stored = self.store.get(key)
+            if stored:
+                entry = {'value': stored['value'], 'created_at': stored['created_at']}
+                with self._lock:
+                    self._entries[key] = entry
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = {'value': value, 'created_at': time.time()}
+        if self.store is not None:
+            self.store.put(key, value)
+    
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+    
+    def stats(self):
+        """Return hit/miss counters and the number of cached entries."""
+        with self._lock:
+            entries = len(self._entries)
+        stored_bytes = self.store.stats()['bytes'] if self.store is not None else 0
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': stored_bytes}
+
+jira_list_cache = MemoryCache(
+    SqliteCache(os.path.join(CACHE_DIR, 'jira_lists.sqlite3')) if JIRA_LIST_CACHE_PERSIST else None
+)
+
+def format_board(board):
+    return {
+        'id': board.id,
+        'name': board.name,
+        'type': board.type
+    }
+
+def format_sprint(sprint):
+    # Future sprints come without dates
+    return {
+        'id': sprint.id,
+        'name': sprint.name,
+        'state': sprint.state,
+        'startDate': getattr(sprint, 'startDate', None),
+        'endDate': getattr(sprint, 'endDate', None),
+        'completeDate': getattr(sprint, 'completeDate', None),
+        'goal': sprint.goal if hasattr(sprint, 'goal') else None
+    }
+
+def get_cached_boards(jira_client, refresh=False):
+    """The board list, reloaded from Jira once it is older than BOARD_LIST_TTL_SECONDS."""
+    cached = jira_list_cache.get('boards')
+    if cached and not refresh and time.time() - cached['created_at'] <= BOARD_LIST_TTL_SECONDS:
+        return cached['value']
+    
+    boards = [format_board(board) for board in call_jira_with_backoff(jira_client.boards, maxResults=False)]
+    jira_list_cache.put('boards', boards)
+    return boards
+
+def get_cached_sprints(jira_client, board_id, refresh=False, stats=None):
+    """All sprints of a board as dicts, closed ones first.
+
+    Closed sprints are cached for good. Once the list is older than SPRINT_LIST_TTL_SECONDS
+    only the active and future sprints are fetched again; sprints that dropped out of
+    that list since are looked up one by one, as they have usually just been closed.
+    refresh=True reloads the whole list.
+    """
+    cache_key = f'sprints:{board_id}'
+    cached = jira_list_cache.get(cache_key)
+    if cached and not refresh:
+        if time.time() - cached['created_at'] <= SPRINT_LIST_TTL_SECONDS:
+            return cached['value']['closed'] + cached['value']['open']
+        
+        closed = cached['value']['closed']
+        open_sprints = [
+            format_sprint(sprint)
+            for sprint in call_jira_with_backoff(jira_client.sprints, board_id, state='active,future', maxResults=False, stats=stats)
+        ]
+        open_ids = {sprint['id'] for sprint in open_sprints}
+        for previous in cached['value']['open']:
+            if previous['id'] in open_ids:
+                continue
+            try:
+                sprint = format_sprint(call_jira_with_backoff(jira_client.sprint, previous['id'], stats=stats))
+            except JIRAError as e:
+                if e.status_code != 404:
+                    raise
+                continue
+            if sprint['state'] == 'closed':
+                closed = closed + [sprint]
+    else:
+        sprints = [format_sprint(sprint) for sprint in call_jira_with_backoff(jira_client.sprints, board_id, maxResults=False, stats=stats)]
+        closed = [sprint for sprint in sprints if sprint['state'] == 'closed']
+        open_sprints = [sprint for sprint in sprints if sprint['state'] != 'closed']
+    
+    jira_list_cache.put(cache_key, {'closed': closed, 'open': open_sprints})
+    return closed + open_sprints
+
+SPRINT_STATES = ('closed', 'active', 'future')
+
+def sort_sprints_by_end(sprints):
+    """Most recently ending sprints first; sprints without an end date (future ones) last.
+
+    Each end date is parsed once up front rather than compared as raw strings.
+    """
+    keyed = [(parse_jira_datetime(sprint.get('endDate')), position, sprint) for position, sprint in enumerate(sprints)]
+    dated = sorted((item for item in keyed if item[0] is not None), key=lambda item: item[0], reverse=True)
+    undated = [item for item in keyed if item[0] is None]
+    return [sprint for _, _, sprint in dated + undated]
+
+def filter_sprints(sprints, states=None, since=None, until=None):
+    """Keep sprints in one of `states` whose dates overlap the since/until window.
+
+    A sprint overlaps when it ends on or after `since` and starts on or before `until`;
+    sprints missing the date a bound needs are left out once that bound is given.
+    """
+    filtered = []
+    for sprint in sprints:
+        if states and sprint['state'] not in states:
+            continue
+        if since is not None:
+            end = parse_jira_datetime(sprint.get('endDate'))
+            if end is None or end < since:
+                continue
+        if until is not None:
+            start = parse_jira_datetime(sprint.get('startDate'))
+            if start is None or start > until:
+                continue
+        filtered.append(sprint)
+    return filtered
+
+def parse_date_arg(name, end_of_day=False):
+    """Read a date (YYYY-MM-DD) or Jira timestamp from the query string as a UTC datetime."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    if len(value) == 10:
+        value += 'T23:59:59' if end_of_day else 'T00:00:00'
+    parsed = parse_jira_datetime(value)
+    if parsed is None:
+        raise ValueError(f"{name} must be a date such as 2025-05-01")
+    return parsed
+
 @app.route('/api/boards', methods=['GET'])
 def get_boards():
     try:
-        jira_client = get_jira_client()
-        boards = jira_client.boards()
-        return jsonify([{
-            'id': board.id,
-            'name': board.name,
-            'type': board.type
-        } for board in boards])
+        with jira_pool.client() as jira_client:
+            boards = get_cached_boards(jira_client, refresh=request.args.get('refresh') == 'true')
+        return jsonify(boards)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -64,146 +490,816 @@ def get_sprints():
         board_id = request.args.get('boardId')
         if not board_id:
             return jsonify({'error': 'Board ID is required'}), 400
-
-        jira_client = get_jira_client()
-        sprints = jira_client.sprints(board_id)
         
-        # Format sprint data
-        formatted_sprints = []
-        for sprint in sprints:
-            formatted_sprints.append({
-                'id': sprint.id,
-                'name': sprint.name,
-                'state': sprint.state,
-                'startDate': sprint.startDate,
-                'endDate': sprint.endDate,
-                'goal': sprint.goal if hasattr(sprint, 'goal') else None
-            })
+        try:
+            states = [state.strip().lower() for state in request.args.get('state', '').split(',') if state.strip()]
+            unknown = [state for state in states if state not in SPRINT_STATES]
+            if unknown:
+                raise ValueError(f"Unknown sprint state: {', '.join(unknown)}")
+            since = parse_date_arg('from')
+            until = parse_date_arg('to', end_of_day=True)
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            if offset < 0 or (limit is not None and limit < 1):
+                raise ValueError("offset must be >= 0 and limit >= 1")
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with jira_pool.client() as jira_client:
+            sprints = get_cached_sprints(jira_client, board_id, refresh=request.args.get('refresh') == 'true')
         
         # Sort sprints by end date (most recent first)
-        formatted_sprints.sort(key=lambda x: x['endDate'] if x['endDate'] else datetime.min, reverse=True)
+        sprints = sort_sprints_by_end(filter_sprints(sprints, states, since, until))
+        page = sprints[offset:offset + limit] if limit else sprints[offset:]
         
-        return jsonify(formatted_sprints)
+        response = jsonify([
+            {field: sprint[field] for field in ('id', 'name', 'state', 'startDate', 'endDate', 'goal')}
+            for sprint in page
+        ])
+        response.headers['X-Total-Count'] = str(len(sprints))
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def get_sprint_stories(jira_client, sprint_id):
-    # JQL query to get all stories in the sprint
-    jql = f'sprint = {sprint_id} AND type in (Story, Task, Bug) ORDER BY created DESC'
-    issues = jira_client.search_issues(jql, maxResults=False, expand='changelog,renderedFields')
-    
-    stories = []
-    for issue in issues:
-        # Get all available fields
-        story_data = {
-            'key': issue.key,
-            'summary': issue.fields.summary,
-            'description': issue.fields.description,
-            'status': issue.fields.status.name,
-            'type': issue.fields.issuetype.name,
-            'priority': getattr(issue.fields, 'priority', None).name if getattr(issue.fields, 'priority', None) else None,
-            'assignee': getattr(issue.fields.assignee, 'displayName', None) if issue.fields.assignee else None,
-            'reporter': getattr(issue.fields.reporter, 'displayName', None) if issue.fields.reporter else None,
-            'created': issue.fields.created,
-            'updated': issue.fields.updated,
-            'resolution': getattr(issue.fields.resolution, 'name', None) if issue.fields.resolution else None,
-            'labels': getattr(issue.fields, 'labels', []),
-            'components': [comp.name for comp in getattr(issue.fields, 'components', [])],
-            'story_points': getattr(issue.fields, 'customfield_10016', None),  # Adjust field ID based on your Jira setup
-            'epic_link': getattr(issue.fields, 'customfield_10014', None),  # Adjust field ID based on your Jira setup
-            'subtasks': [],
-            'changelog': [],
-            'comments': [],
-            'blockers': []
-        }
-        
-        # Get subtasks
-        subtasks = jira_client.search_issues(f'parent = {issue.key}', expand='changelog')
-        for subtask in subtasks:
-            subtask_data = {
-                'key': subtask.key,
-                'summary': subtask.fields.summary,
-                'description': subtask.fields.description,
-                'status': subtask.fields.status.name,
-                'assignee': getattr(subtask.fields.assignee, 'displayName', None) if subtask.fields.assignee else None,
-                'created': subtask.fields.created,
-                'updated': subtask.fields.updated,
-                'changelog': [],
-                'blockers': []
-            }
-            
-            # Get subtask changelog
-            for history in subtask.changelog.histories:
-                for item in history.items:
-                    subtask_data['changelog'].append({
-                        'date': history.created,
-                        'author': history.author.displayName,
-                        'field': item.field,
-                        'from': item.fromString,
-                        'to': item.toString
-                    })
-            
-            # Get subtask blockers using issue links
-            try:
-                blocker_links = jira_client.search_issues(f'issue in linkedIssues({subtask.key}) AND type in (Bug, Story, Task)')
-                for blocker in blocker_links:
-                    subtask_data['blockers'].append({
-                        'key': blocker.key,
-                        'summary': blocker.fields.summary,
-                        'status': blocker.fields.status.name
-                    })
-            except Exception as e:
-                print(f"Error fetching blockers for subtask {subtask.key}: {str(e)}")
-            
-            story_data['subtasks'].append(subtask_data)
-        
-        # Get story changelog
-        for history in issue.changelog.histories:
-            for item in history.items:
-                story_data['changelog'].append({
-                    'date': history.created,
-                    'author': history.author.displayName,
-                    'field': item.field,
-                    'from': item.fromString,
-                    'to': item.toString
-                })
-        
-        # Get comments
-        if hasattr(issue.fields, 'comment'):
-            for comment in issue.fields.comment.comments:
-                story_data['comments'].append({
-                    'author': comment.author.displayName,
-                    'body': comment.body,
-                    'created': comment.created
-                })
-        
-        # Get story blockers using issue links
+# Page size used when paging through JQL search results
+JIRA_SEARCH_PAGE_SIZE = int(os.getenv('JIRA_SEARCH_PAGE_SIZE', '100'))
+# Maximum number of issue keys put into a single `parent in (...)` query
+JIRA_KEY_BATCH_SIZE = int(os.getenv('JIRA_KEY_BATCH_SIZE', '50'))
+# Linked issue types that are reported as blockers
+BLOCKER_ISSUE_TYPES = ('Bug', 'Story', 'Task')
+
+# Number of concurrent Jira requests used while loading a sprint
+JIRA_FETCH_WORKERS = int(os.getenv('JIRA_FETCH_WORKERS', '8'))
+# Retry settings for rate limited (HTTP 429) or temporarily unavailable (HTTP 503) responses
+JIRA_MAX_RETRIES = int(os.getenv('JIRA_MAX_RETRIES', '5'))
+JIRA_BACKOFF_SECONDS = float(os.getenv('JIRA_BACKOFF_SECONDS', '1'))
+JIRA_MAX_BACKOFF_SECONDS = float(os.getenv('JIRA_MAX_BACKOFF_SECONDS', '60'))
+JIRA_RETRY_STATUS_CODES = (429, 503)
+# Upper bound on Jira requests per second shared by every thread (0 = no limit)
+JIRA_REQUESTS_PER_SECOND = float(os.getenv('JIRA_REQUESTS_PER_SECOND', '0'))
+
+_fetch_stats_lock = threading.Lock()
+
+def new_fetch_stats():
+    """Create the per-request counters filled in while fetching from Jira."""
+    return {'jira_round_trips': 0}
+
+def record_round_trip(stats):
+    """Count one Jira round trip; safe to call from fetch worker threads."""
+    if stats is None:
+        return
+    with _fetch_stats_lock:
+        stats['jira_round_trips'] += 1
+
+def get_retry_delay(error, attempt):
+    """Work out how long to wait before retrying, honouring Jira's Retry-After header."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After')
+    if retry_after:
         try:
-            blocker_links = jira_client.search_issues(f'issue in linkedIssues({issue.key}) AND type in (Bug, Story, Task)')
-            for blocker in blocker_links:
-                story_data['blockers'].append({
-                    'key': blocker.key,
-                    'summary': blocker.fields.summary,
-                    'status': blocker.fields.status.name
-                })
-        except Exception as e:
-            print(f"Error fetching blockers for story {issue.key}: {str(e)}")
-        
-        stories.append(story_data)
+            return min(max(float(retry_after), 0), JIRA_MAX_BACKOFF_SECONDS)
+        except ValueError:
+            pass
+    # Exponential backoff with jitter so parallel workers don't retry in lockstep
+    delay = JIRA_BACKOFF_SECONDS * (2 ** attempt) + random.uniform(0, JIRA_BACKOFF_SECONDS)
+    return min(delay, JIRA_MAX_BACKOFF_SECONDS)
+
+class RateLimiter:
+    """Spaces out calls made from any thread so they stay under a fixed rate."""
+    
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second > 0 else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the caller may make its next call."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+jira_rate_limiter = RateLimiter(JIRA_REQUESTS_PER_SECOND)
+
+def call_jira_with_backoff(func, *args, stats=None, **kwargs):
+    """Call a Jira client method, backing off and retrying while Jira rate limits us."""
+    attempt = 0
+    while True:
+        jira_rate_limiter.wait()
+        try:
+            result = func(*args, **kwargs)
+            record_round_trip(stats)
+            return result
+        except JIRAError as e:
+            record_round_trip(stats)
+            if e.status_code not in JIRA_RETRY_STATUS_CODES or attempt >= JIRA_MAX_RETRIES:
+                raise
+            delay = get_retry_delay(e, attempt)
+            print(f"Jira returned {e.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{JIRA_MAX_RETRIES})")
+            time.sleep(delay)
+            attempt += 1
+
+def map_concurrently(func, items, workers=None):
+    """Apply func to every item over a bounded thread pool, keeping the input order."""
+    items = list(items)
+    workers = JIRA_FETCH_WORKERS if workers is None else workers
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+def search_all_issues(jira_client, jql, stats=None, workers=None, **kwargs):
+    """Run a JQL search, fetching the pages after the first one concurrently.
+
+    Every page counts as one Jira round trip in stats.
+    """
+    first_page = call_jira_with_backoff(
+        jira_client.search_issues, jql, startAt=0, maxResults=JIRA_SEARCH_PAGE_SIZE, stats=stats, **kwargs
+    )
+    issues = list(first_page)
+    total = getattr(first_page, 'total', None)
+    if not issues or total is None or len(issues) >= total:
+        return issues
+    
+    # Jira may cap the page size below what we asked for, so page by what it returned
+    page_size = len(issues)
+    
+    def fetch_page(start_at):
+        return call_jira_with_backoff(
+            jira_client.search_issues, jql, startAt=start_at, maxResults=page_size, stats=stats, **kwargs
+        )
+    
+    for page in map_concurrently(fetch_page, range(page_size, total, page_size), workers):
+        issues.extend(page)
+    return issues
+
+def extract_changelog(issue):
+    """Flatten the expanded changelog of an issue into a list of change dicts."""
+    changelog = []
+    for history in issue.changelog.histories:
+        for item in history.items:
+            changelog.append({
+                'date': history.created,
+                'author': history.author.displayName,
+                'field': item.field,
+                'from': item.fromString,
+                'to': item.toString
+            })
+    return changelog
+
+def extract_blockers(issue):
+    """Resolve blockers from the issuelinks field already present on the issue."""
+    blockers = []
+    seen = set()
+    for link in getattr(issue.fields, 'issuelinks', None) or []:
+        linked = getattr(link, 'outwardIssue', None) or getattr(link, 'inwardIssue', None)
+        if not linked or linked.key in seen:
+            continue
+        issue_type = getattr(getattr(linked.fields, 'issuetype', None), 'name', None)
+        if issue_type not in BLOCKER_ISSUE_TYPES:
+            continue
+        seen.add(linked.key)
+        blockers.append({
+            'key': linked.key,
+            'summary': linked.fields.summary,
+            'status': linked.fields.status.name
+        })
+    return blockers
+
+# Custom field ids of story points and epic link; adjust them to your Jira setup
+STORY_POINTS_FIELD = os.getenv('JIRA_STORY_POINTS_FIELD', 'customfield_10016')
+EPIC_LINK_FIELD = os.getenv('JIRA_EPIC_LINK_FIELD', 'customfield_10014')
+
+# Only the fields the story and subtask dicts read are requested from Jira
+STORY_FIELDS = [
+    'summary', 'description', 'status', 'issuetype', 'priority', 'assignee', 'reporter', 'created', 'updated',
+    'resolution', 'labels', 'components', STORY_POINTS_FIELD, EPIC_LINK_FIELD, 'comment', 'issuelinks'
+]
+SUBTASK_FIELDS = ['summary', 'description', 'status', 'assignee', 'created', 'updated', 'issuelinks', 'parent']
+
+def get_subtasks_by_parent(jira_client, parent_keys, stats=None, include_changelog=True):
+    """Fetch the subtasks of all given parents with batched `parent in (...)` queries run in parallel."""
+    batches = [parent_keys[i:i + JIRA_KEY_BATCH_SIZE] for i in range(0, len(parent_keys), JIRA_KEY_BATCH_SIZE)]
+    expand = 'changelog' if include_changelog else None
+    
+    def fetch_batch(batch):
+        # Batches already run in parallel, so page through each one sequentially
+        jql = f'parent in ({", ".join(batch)})'
+        return search_all_issues(jira_client, jql, stats, workers=1, fields=SUBTASK_FIELDS, expand=expand)
+    
+    subtasks_by_parent = {key: [] for key in parent_keys}
+    for subtasks in map_concurrently(fetch_batch, batches):
+        for subtask in subtasks:
+            parent_key = subtask.fields.parent.key
+            subtasks_by_parent.setdefault(parent_key, []).append(subtask)
+    return subtasks_by_parent
+
+# Issue types loaded as sprint stories
+STORY_ISSUE_TYPES = ('Story', 'Task', 'Bug')
+
+def build_subtask_data(subtask):
+    """Normalize a fetched subtask into the dict shape used by the reports.
+
+    The changelog is None when the subtask was fetched without it.
+    """
+    return {
+        'key': subtask.key,
+        'summary': subtask.fields.summary,
+        'description': subtask.fields.description,
+        'status': subtask.fields.status.name,
+        'assignee': getattr(subtask.fields.assignee, 'displayName', None) if subtask.fields.assignee else None,
+        'created': subtask.fields.created,
+        'updated': subtask.fields.updated,
+        'changelog': extract_changelog(subtask) if hasattr(subtask, 'changelog') else None,
+        'blockers': extract_blockers(subtask)
+    }
+
+def build_story_data(issue, subtasks):
+    """Normalize a fetched story and its subtasks into the dict shape used by the reports.
+
+    The changelog is None when the story was fetched without it.
+    """
+    # Get all available fields
+    story_data = {
+        'key': issue.key,
+        'summary': issue.fields.summary,
+        'description': issue.fields.description,
+        'status': issue.fields.status.name,
+        'type': issue.fields.issuetype.name,
+        'priority': getattr(issue.fields, 'priority', None).name if getattr(issue.fields, 'priority', None) else None,
+        'assignee': getattr(issue.fields.assignee, 'displayName', None) if issue.fields.assignee else None,
+        'reporter': getattr(issue.fields.reporter, 'displayName', None) if issue.fields.reporter else None,
+        'created': issue.fields.created,
+        'updated': issue.fields.updated,
+        'resolution': getattr(issue.fields.resolution, 'name', None) if issue.fields.resolution else None,
+        'labels': getattr(issue.fields, 'labels', []),
+        'components': [comp.name for comp in getattr(issue.fields, 'components', [])],
+        'story_points': getattr(issue.fields, STORY_POINTS_FIELD, None),
+        'epic_link': getattr(issue.fields, EPIC_LINK_FIELD, None),
+        'subtasks': [build_subtask_data(subtask) for subtask in subtasks],
+        'changelog': extract_changelog(issue) if hasattr(issue, 'changelog') else None,
+        'comments': [],
+        'blockers': extract_blockers(issue)
+    }
+    
+    # Get comments
+    if hasattr(issue.fields, 'comment'):
+        for comment in issue.fields.comment.comments:
+            story_data['comments'].append({
+                'author': comment.author.displayName,
+                'body': comment.body,
+                'created': comment.created
+            })
+    
+    return story_data
+
+def get_sprint_stories(jira_client, sprint_id, stats=None, include_changelog=True):
+    """Fetch all stories of a sprint with their subtasks, changelogs, comments and blockers.
+
+    Subtasks are loaded in batches and blockers are taken from the issue links on the
+    fetched issues, so the number of Jira round trips does not grow per story. Without
+    include_changelog the changelogs are left as None; add_changelogs loads them later.
+    """
+    # JQL query to get all stories in the sprint
+    jql = f'sprint = {sprint_id} AND type in ({", ".join(STORY_ISSUE_TYPES)}) ORDER BY created DESC'
+    expand = 'changelog' if include_changelog else None
+    issues = search_all_issues(jira_client, jql, stats, fields=STORY_FIELDS, expand=expand)
+    
+    # Get subtasks for all stories at once
+    subtasks_by_parent = get_subtasks_by_parent(
+        jira_client, [issue.key for issue in issues], stats, include_changelog=include_changelog
+    )
+    
+    stories = [build_story_data(issue, subtasks_by_parent.get(issue.key, [])) for issue in issues]
+    
+    if stats is not None:
+        print(f"Fetched {len(stories)} stories for sprint {sprint_id} in {stats['jira_round_trips']} Jira round trips")
+    
+    return stories
+
+def get_changelogs(jira_client, keys, stats=None):
+    """Fetch only the changelogs of the given issues with batched `key in (...)` queries run in parallel."""
+    batches = [keys[i:i + JIRA_KEY_BATCH_SIZE] for i in range(0, len(keys), JIRA_KEY_BATCH_SIZE)]
+    
+    def fetch_batch(batch):
+        jql = f'key in ({", ".join(batch)})'
+        return search_all_issues(jira_client, jql, stats, workers=1, fields='updated', expand='changelog')
+    
+    changelogs = {}
+    for issues in map_concurrently(fetch_batch, batches):
+        for issue in issues:
+            changelogs[issue.key] = extract_changelog(issue)
+    return changelogs
+
+def add_changelogs(jira_client, stories, stats=None):
+    """Load the changelogs of stories and subtasks that were fetched without them."""
+    keys = []
+    for story in stories:
+        if story['changelog'] is None:
+            keys.append(story['key'])
+        keys.extend(subtask['key'] for subtask in story['subtasks'] if subtask['changelog'] is None)
+    if not keys:
+        return stories
+    
+    changelogs = get_changelogs(jira_client, keys, stats)
+    
+    def with_changelog(item):
+        if item['changelog'] is not None:
+            return item
+        return dict(item, changelog=changelogs.get(item['key'], []))
+    
+    return [
+        dict(with_changelog(story), subtasks=[with_changelog(subtask) for subtask in story['subtasks']])
+        for story in stories
+    ]
+
+def format_jql_datetime(jira_datetime_str, overlap_minutes=1):
+    """Turn a Jira timestamp into a JQL date literal, stepping back to cover minute rounding.
+
+    JQL dates are interpreted in the Jira user's timezone, which is also the offset Jira
+    uses in the timestamps it returns, so the local wall-clock part is used as is.
+    """
+    local = datetime.strptime(jira_datetime_str[:16], '%Y-%m-%dT%H:%M') - timedelta(minutes=overlap_minutes)
+    return local.strftime('%Y-%m-%d %H:%M')
+
+def sync_sprint_stories(jira_client, sprint_id, cached_stories, since, stats=None, include_changelog=True):
+    """Bring a cached story snapshot up to date by re-fetching only issues updated since `since`.
+
+    Changed stories are replaced, stories whose subtasks changed get their subtasks
+    reloaded, and stories that left the sprint are dropped.
+    """
+    expand = 'changelog' if include_changelog else None
+    jql = f'sprint = {sprint_id} AND updated >= "{format_jql_datetime(since)}"'
+    changed = search_all_issues(jira_client, jql, stats, fields=STORY_FIELDS + ['parent'], expand=expand)
+    
+    changed_stories = {issue.key: issue for issue in changed if issue.fields.issuetype.name in STORY_ISSUE_TYPES}
+    changed_parents = {
+        issue.fields.parent.key for issue in changed
+        if getattr(issue.fields, 'parent', None) and issue.key not in changed_stories
+    }
+    
+    # Current membership and order of the sprint, without any heavy fields
+    jql = f'sprint = {sprint_id} AND type in ({", ".join(STORY_ISSUE_TYPES)}) ORDER BY created DESC'
+    current_keys = [issue.key for issue in search_all_issues(jira_client, jql, stats, fields='updated')]
+    
+    stories_by_key = {story['key']: story for story in cached_stories}
+    # Stories in the sprint that we know nothing about still need a full fetch
+    missing_keys = [key for key in current_keys if key not in stories_by_key and key not in changed_stories]
+    for i in range(0, len(missing_keys), JIRA_KEY_BATCH_SIZE):
+        batch = missing_keys[i:i + JIRA_KEY_BATCH_SIZE]
+        jql = f'key in ({", ".join(batch)})'
+        for issue in search_all_issues(jira_client, jql, stats, fields=STORY_FIELDS, expand=expand):
+            changed_stories[issue.key] = issue
+    
+    parent_keys = [key for key in current_keys if key in changed_stories or key in changed_parents]
+    subtasks_by_parent = get_subtasks_by_parent(jira_client, parent_keys, stats, include_changelog=include_changelog)
+    
+    for key, issue in changed_stories.items():
+        stories_by_key[key] = build_story_data(issue, subtasks_by_parent.get(key, []))
+    for key in changed_parents:
+        if key in stories_by_key and key not in changed_stories:
+            stories_by_key[key] = dict(stories_by_key[key], subtasks=[
+                build_subtask_data(subtask) for subtask in subtasks_by_parent.get(key, [])
+            ])
+    
+    stories = [stories_by_key[key] for key in current_keys if key in stories_by_key]
+    
+    if stats is not None:
+        print(f"Synced {len(changed)} changed issues into sprint {sprint_id} in {stats['jira_round_trips']} Jira round trips")
+    
+    return stories
+
+# Snapshot cache of normalized sprint stories
+SPRINT_CACHE_TTL_SECONDS = float(os.getenv('SPRINT_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+SPRINT_CACHE_MAX_MB = float(os.getenv('SPRINT_CACHE_MAX_MB', '256'))
+# Merge only changed issues into cached snapshots of sprints that are still open
+SPRINT_INCREMENTAL_SYNC = os.getenv('SPRINT_INCREMENTAL_SYNC', 'true').lower() == 'true'
+
+sprint_snapshot_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'sprint_snapshots.sqlite3'),
+    ttl_seconds=SPRINT_CACHE_TTL_SECONDS,
+    max_bytes=int(SPRINT_CACHE_MAX_MB * 1024 * 1024)
+)
+
+def get_sprint_watermark(jira_client, sprint_id, stats=None):
+    """Return the most recent `updated` timestamp of the sprint's issues and a hash of their keys.
+
+    Removing an issue from the sprint leaves the timestamp of the remaining issues
+    unchanged, so the membership hash is what reveals it.
+    """
+    issues = search_all_issues(jira_client, f'sprint = {sprint_id} ORDER BY updated DESC', stats, fields='updated')
+    if not issues:
+        return {'updated': None, 'members': None}
+    keys = ','.join(sorted(issue.key for issue in issues))
+    return {
+        'updated': issues[0].fields.updated,
+        'members': hashlib.sha256(keys.encode('utf-8')).hexdigest()
+    }
+
+def make_snapshot_tag(state, watermark):
+    """Serialize the sprint state and watermark a snapshot was taken at into its cache tag."""
+    return json.dumps(dict(watermark, state=state), sort_keys=True)
+
+def read_snapshot_tag(tag):
+    """Parse a snapshot tag, returning None for missing or outdated tags."""
+    try:
+        tag = json.loads(tag) if tag else None
+    except ValueError:
+        return None
+    return tag if isinstance(tag, dict) and {'state', 'updated', 'members'} <= tag.keys() else None
+
+def load_sprint_stories(jira_client, sprint, stats=None, refresh=False, include_changelog=True):
+    """Return the sprint's stories from the snapshot cache, re-fetching them when stale.
+
+    Snapshots taken after the sprint closed are served as they are; any other snapshot
+    is used while the sprint's watermark (latest `updated` and membership) is unchanged
+    and otherwise synced incrementally with only the issues updated since the last pull. Callers that
+    do not need changelogs pass include_changelog=False; a full snapshot still serves
+    them, otherwise a lighter snapshot without changelogs is kept under its own key.
+    """
+    sprint_id = str(sprint.id)
+    cache_key = sprint_id
+    cached = None if refresh else sprint_snapshot_cache.get(cache_key)
+    if not include_changelog and not cached:
+        cache_key = f'{sprint_id}:no-changelog'
+        cached = None if refresh else sprint_snapshot_cache.get(cache_key)
+    # Keep a full snapshot full even when this caller does not need the changelogs
+    include_changelog = cache_key == sprint_id
+    
+    state = getattr(sprint, 'state', None)
+    tag = read_snapshot_tag(cached['tag']) if cached else None
+    
+    # Only a snapshot taken after the sprint closed is final
+    if tag and tag['state'] == 'closed' and state == 'closed':
+        if stats is not None:
+            stats['snapshot_cache'] = 'hit'
+        return cached['value']
+    
+    watermark = get_sprint_watermark(jira_client, sprint_id, stats)
+    if tag and tag['updated'] == watermark['updated'] and tag['members'] == watermark['members']:
+        if stats is not None:
+            stats['snapshot_cache'] = 'hit'
+        if tag['state'] != state:
+            # Still accurate, but record the new state so a now closed sprint skips the check next time
+            sprint_snapshot_cache.put(cache_key, cached['value'], tag=make_snapshot_tag(state, watermark))
+        return cached['value']
+    
+    if tag and tag['updated'] and watermark['updated'] and SPRINT_INCREMENTAL_SYNC:
+        if stats is not None:
+            stats['snapshot_cache'] = 'synced'
+        stories = sync_sprint_stories(
+            jira_client, sprint_id, cached['value'], tag['updated'], stats, include_changelog=include_changelog
+        )
+        sprint_snapshot_cache.put(cache_key, stories, tag=make_snapshot_tag(state, watermark))
+        return stories
     
+    if stats is not None:
+        stats['snapshot_cache'] = 'stale' if cached else 'miss'
+    stories = get_sprint_stories(jira_client, sprint_id, stats, include_changelog=include_changelog)
+    sprint_snapshot_cache.put(cache_key, stories, tag=make_snapshot_tag(state, watermark))
     return stories
 
+# Compact in-memory records for sprints held in memory in bulk. Repeated names (fields,
+# statuses, people, labels) are interned so each distinct value is stored once.
+INTERNED_CHANGE_FIELDS = {'status', 'Sprint', 'assignee', 'priority', 'issuetype', 'resolution', 'Story Points'}
+
+def intern_name(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Record:
+    """Base of the __slots__ records; also readable by the keys of their JSON shape, like the dicts they replace."""
+    __slots__ = ()
+    # JSON key -> attribute name, where they differ
+    key_aliases = {}
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.key_aliases.get(key, key))
+        except AttributeError:
+            raise KeyError(key)
+    
+    def get(self, key, default=None):
+        return getattr(self, self.key_aliases.get(key, key), default)
+    
+    def __contains__(self, key):
+        return hasattr(self, self.key_aliases.get(key, key))
+    
+    def to_dict(self):
+        """Return the JSON shape the API uses for this record."""
+        attribute_keys = {attribute: key for key, attribute in self.key_aliases.items()}
+        return {attribute_keys.get(attribute, attribute): to_plain(getattr(self, attribute)) for attribute in self.__slots__}
+
+def to_plain(value):
+    """Convert records, and lists or tuples of them, back to plain JSON values."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+class ChangelogEvent(Record):
+    __slots__ = ('date', 'author', 'field', 'from_value', 'to_value')
+    key_aliases = {'from': 'from_value', 'to': 'to_value'}
+    
+    def __init__(self, date, author, field, from_value, to_value):
+        self.date = date
+        self.author = author
+        self.field = field
+        self.from_value = from_value
+        self.to_value = to_value
+    
+    @classmethod
+    def from_dict(cls, change):
+        if isinstance(change, cls):
+            return change
+        field = intern_name(change['field'])
+        # Values of free-text fields are rarely repeated, so only status-like values are interned
+        intern_value = intern_name if field in INTERNED_CHANGE_FIELDS else (lambda value: value)
+        return cls(change['date'], intern_name(change['author']), field,
+                   intern_value(change['from']), intern_value(change['to']))
+
+def to_changelog_events(changelog):
+    """Changelog dicts as a tuple of ChangelogEvent records; None stays None (changelog not loaded)."""
+    return None if changelog is None else tuple(ChangelogEvent.from_dict(change) for change in changelog)
+
+class SubtaskRecord(Record):
+    __slots__ = ('key', 'summary', 'description', 'status', 'assignee', 'created', 'updated', 'changelog', 'blockers')
+    
+    def __init__(self, **fields):
+        for attribute in self.__slots__:
+            setattr(self, attribute, fields.get(attribute))
+    
+    @classmethod
+    def from_dict(cls, subtask):
+        if isinstance(subtask, cls):
+            return subtask
+        return cls(**dict(
+            subtask,
+            status=intern_name(subtask['status']),
+            assignee=intern_name(subtask['assignee']),
+            changelog=to_changelog_events(subtask['changelog'])
+        ))
+
+class StoryRecord(Record):
+    __slots__ = (
+        'key', 'summary', 'description', 'status', 'type', 'priority', 'assignee', 'reporter', 'created', 'updated',
+        'resolution', 'labels', 'components', 'story_points', 'epic_link', 'subtasks', 'changelog', 'comments', 'blockers'
+    )
+    
+    def __init__(self, **fields):
+        for attribute in self.__slots__:
+            setattr(self, attribute, fields.get(attribute))
+    
+    @classmethod
+    def from_dict(cls, story):
+        if isinstance(story, cls):
+            return story
+        return cls(**dict(
+            story,
+            status=intern_name(story['status']),
+            type=intern_name(story['type']),
+            priority=intern_name(story['priority']),
+            assignee=intern_name(story['assignee']),
+            reporter=intern_name(story['reporter']),
+            resolution=intern_name(story['resolution']),
+            labels=tuple(intern_name(label) for label in story['labels'] or ()),
+            components=tuple(intern_name(component) for component in story['components'] or ()),
+            subtasks=tuple(SubtaskRecord.from_dict(subtask) for subtask in story['subtasks']),
+            changelog=to_changelog_events(story['changelog'])
+        ))
+
+def to_story_records(stories):
+    """Convert story dicts (as cached and returned by the API) to StoryRecords."""
+    return [StoryRecord.from_dict(story) for story in stories]
+
+def to_story_dicts(stories):
+    """Convert StoryRecords back to the API's story dicts; dicts pass through unchanged."""
+    return [story.to_dict() if isinstance(story, Record) else story for story in stories]
+
+# Cache of Gemini responses keyed by model, prompt and generation config
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+LLM_CACHE_MAX_MB = float(os.getenv('LLM_CACHE_MAX_MB', '128'))
+# Upper bound on Gemini requests per minute shared by every thread (0 = no limit)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '0'))
+
+llm_rate_limiter = RateLimiter(GEMINI_REQUESTS_PER_MINUTE / 60)
+
+llm_response_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'llm_responses.sqlite3'),
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)
+)
+
+def get_llm_cache_key(prompt, generation_config=None):
+    """Hash the model name, prompt and generation config into a cache key."""
+    payload = json.dumps({
+        'model': GEMINI_MODEL_NAME,
+        'prompt': prompt,
+        'generation_config': generation_config or {}
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def generate_text(prompt, generation_config=None, parse=None):
+    """Send a prompt to Gemini and return the response text, reusing cached responses.
+
+    With parse given, returns parse(text) instead, and a response is only cached once it
+    parsed; a malformed reply raises here and is asked for again on the next call.
+    """
+    cache_key = get_llm_cache_key(prompt, generation_config)
+    if LLM_CACHE_ENABLED:
+        cached = llm_response_cache.get(cache_key)
+        if cached:
+            if parse is None:
+                return cached['value']
+            try:
+                return parse(cached['value'])
+            except ValueError:
+                # Left over from before responses were validated
+                llm_response_cache.delete(cache_key)
+    
+    llm_rate_limiter.wait()
+    if generation_config:
+        response = model.generate_content(prompt, generation_config=generation_config)
+    else:
+        response = model.generate_content(prompt)
+    text = response.text
+    result = parse(text) if parse else text
+    
+    if LLM_CACHE_ENABLED:
+        llm_response_cache.put(cache_key, text)
+    return result
+
 def generate_subgoals(sprint_goal):
     prompt = f"""
     Do not summarize, rewrite, or rephrase any part of the text. Each subgoal should be exactly as it appears in the original sprint goal, just separated out clearly. Do not make up any subgoals. Do not split any sentences.
     Sprint Goal: {sprint_goal}
     """
     
-    response = model.generate_content(prompt)
-    return response.text
+    return generate_text(prompt)
+
+# Embedding pre-assignment: stories that clearly match one subgoal skip the LLM
+EMBEDDING_PREASSIGN = os.getenv('EMBEDDING_PREASSIGN', 'true').lower() == 'true'
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing')
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '1024'))
+GEMINI_EMBEDDING_MODEL = os.getenv('GEMINI_EMBEDDING_MODEL', 'models/embedding-001')
+# Minimum cosine similarity to the best subgoal, and lead over the runner-up, for a local assignment
+EMBEDDING_ASSIGN_THRESHOLD = float(os.getenv('EMBEDDING_ASSIGN_THRESHOLD', '0.35'))
+EMBEDDING_ASSIGN_MARGIN = float(os.getenv('EMBEDDING_ASSIGN_MARGIN', '0.1'))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv('EMBEDDING_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+EMBEDDING_CACHE_MAX_MB = float(os.getenv('EMBEDDING_CACHE_MAX_MB', '128'))
+EMBEDDING_TEXT_CHARS = 2000
+
+embedding_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'embeddings.sqlite3'),
+    ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS,
+    max_bytes=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+)
+
+EMBEDDING_STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or',
+    'the', 'to', 'with', 'we', 'our', 'this', 'that', 'will', 'should', 'can', 'all', 'so'
+}
+
+def embed_with_hashing(texts):
+    """Local, deterministic embeddings: hashed word and word-pair counts, L2 normalized."""
+    vectors = np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [word for word in re.findall(r'[a-z0-9]+', (text or '').lower()) if word not in EMBEDDING_STOP_WORDS]
+        for token in words + [f'{first} {second}' for first, second in zip(words, words[1:])]:
+            bucket = zlib.crc32(token.encode('utf-8'))
+            vectors[row, bucket % EMBEDDING_DIMENSIONS] += 1.0 if bucket & 0x80000000 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def embed_with_gemini(texts):
+    """Gemini embeddings, one request per text over the assignment worker pool."""
+    def embed(text):
+        llm_rate_limiter.wait()
+        result = genai.embed_content(model=GEMINI_EMBEDDING_MODEL, content=text or ' ', task_type='semantic_similarity')
+        return result['embedding']
+    vectors = np.array(map_concurrently(embed, texts, ASSIGNMENT_WORKERS), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+# Embedding backends by name; each maps a list of texts to an array of unit vectors
+EMBEDDING_BACKENDS = {
+    'hashing': embed_with_hashing,
+    'gemini': embed_with_gemini
+}
 
-def assign_stories_to_subgoals(stories, subgoals):
-    # Create a detailed prompt for the AI to assign stories to subgoals
+def register_embedding_backend(name, embed_func):
+    """Make an embedding function selectable through EMBEDDING_BACKEND."""
+    EMBEDDING_BACKENDS[name] = embed_func
+
+def get_embedding_backend():
+    backend = EMBEDDING_BACKENDS.get(EMBEDDING_BACKEND)
+    if not backend:
+        raise Exception(f"Unknown embedding backend: {EMBEDDING_BACKEND}")
+    return backend
+
+def embed_texts(items, backend=None):
+    """Embed (cache_key, tag, text) items, reusing vectors whose cached tag still matches."""
+    backend = backend or get_embedding_backend()
+    # Vectors of different backends and sizes never mix
+    prefix = f'{EMBEDDING_BACKEND}:{EMBEDDING_DIMENSIONS}'
+    vectors = [None] * len(items)
+    missing = []
+    cached_entries = embedding_cache.get_many([f'{prefix}:{key}' for key, _, _ in items])
+    for position, (key, tag, text) in enumerate(items):
+        cached = cached_entries.get(f'{prefix}:{key}')
+        if cached and cached['tag'] == tag:
+            vectors[position] = np.array(cached['value'], dtype=np.float32)
+        else:
+            missing.append(position)
+    
+    if missing:
+        computed = backend([items[position][2] for position in missing])
+        new_entries = []
+        for position, vector in zip(missing, computed):
+            key, tag, _ = items[position]
+            new_entries.append((f'{prefix}:{key}', np.round(vector, 6).tolist(), tag))
+            vectors[position] = vector
+        embedding_cache.put_many(new_entries)
+    return np.vstack(vectors) if vectors else np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+def parse_subgoal_lines(subgoals):
+    """Split the generated subgoal text into one subgoal per line, without list markers."""
+    lines = []
+    for line in (subgoals or '').splitlines():
+        line = re.sub(r'^\s*(?:\d+[.)]|[-*•])\s*', '', line).strip()
+        if line:
+            lines.append(line)
+    return lines
+
+def preassign_stories_by_embedding(stories, subgoals):
+    """Assign stories whose best subgoal is clearly ahead by cosine similarity; returns {story key: subgoal}."""
+    subgoal_lines = parse_subgoal_lines(subgoals)
+    if not stories or not subgoal_lines:
+        return {}
+    
+    backend = get_embedding_backend()
+    story_vectors = embed_texts([
+        (
+            f"story:{story['key']}", story.get('updated'),
+            f"{story['summary']}\n{(story['description'] or '')[:EMBEDDING_TEXT_CHARS]}"
+        )
+        for story in stories
+    ], backend)
+    subgoal_vectors = embed_texts([
+        (f"subgoal:{hashlib.sha256(line.encode('utf-8')).hexdigest()}", None, line) for line in subgoal_lines
+    ], backend)
+    
+    similarity = story_vectors @ subgoal_vectors.T
+    ranked = np.sort(similarity, axis=1)
+    best = similarity.argmax(axis=1)
+    best_score = ranked[:, -1]
+    runner_up = ranked[:, -2] if len(subgoal_lines) > 1 else np.zeros(len(stories))
+    confident = (best_score >= EMBEDDING_ASSIGN_THRESHOLD) & (best_score - runner_up >= EMBEDDING_ASSIGN_MARGIN)
+    
+    assigned = {
+        story['key']: subgoal_lines[best[position]]
+        for position, story in enumerate(stories) if confident[position]
+    }
+    print(f"Pre-assigned {len(assigned)} of {len(stories)} stories to subgoals by embedding similarity")
+    return assigned
+
+# Stories per assignment prompt and assignment prompts sent to Gemini at the same time
+ASSIGNMENT_BATCH_SIZE = int(os.getenv('ASSIGNMENT_BATCH_SIZE', '40'))
+ASSIGNMENT_WORKERS = int(os.getenv('ASSIGNMENT_WORKERS', '4'))
+UNASSIGNED_SUBGOAL = 'Unassigned'
+
+def parse_json_response(response_text):
+    """Parse a JSON object from an LLM response, tolerating code fences, text around it and trailing commas."""
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            extracted_json = json_match.group()
+            # Trailing commas are the most common formatting slip
+            for candidate in (extracted_json, re.sub(r',\s*([}\]])', r'\1', extracted_json)):
+                try:
+                    return json.loads(candidate)
+                except json.JSONDecodeError:
+                    pass
+    raise ValueError(f"Failed to parse JSON from response: {response_text[:200]}")
+
+def parse_assignments(response_text):
+    """Parse the assignment list of a batch reply, accepting a bare JSON list as well."""
+    parsed = parse_json_response(response_text)
+    assignments = parsed.get('assignments') if isinstance(parsed, dict) else parsed
+    if not isinstance(assignments, list):
+        raise ValueError(f"Expected a list of assignments, got: {response_text[:200]}")
+    return [assignment for assignment in assignments if isinstance(assignment, dict)]
+
+def assign_story_batch(stories, subgoals):
+    """Ask Gemini to assign one batch of stories to the subgoals; returns {story key: subgoal}."""
     stories_text = "\n".join([
         f"Story {story['key']}:\n"
         f"Summary: {story['summary']}\n"
@@ -219,7 +1315,7 @@ def assign_stories_to_subgoals(stories, subgoals):
     prompt = f"""
     You are a Product Owner analyzing stories from Jira. Below is the list of user stories and sprint goals for the current sprint.
 
-    Your task is to assign each story to the most relevant sprint goal based on the story's description and summary and acceptance criteria. If a story could relate to multiple goals, assign it to the most appropriate primary goal. If a story does not relate to any of the goals, mark it as "Unassigned".
+    Your task is to assign each story to the most relevant sprint goal based on the story's description and summary and acceptance criteria. If a story could relate to multiple goals, assign it to the most appropriate primary goal. If a story does not relate to any of the goals, mark it as "{UNASSIGNED_SUBGOAL}".
     
     Subgoals:
     {subgoals}
@@ -227,20 +1323,71 @@ def assign_stories_to_subgoals(stories, subgoals):
     Stories:
     {stories_text}
     
-    Return the assignments in this format:
-    Subgoal 1:
-    - STORY-123: Story Summary
-    - STORY-456: Story Summary
-
-    Subgoal 2:
-    - STORY-789: Story Summary
+    Return only a JSON object with one entry per story, using the subgoal text exactly as listed above:
+    {{
+        "assignments": [
+            {{"story_id": "STORY-123", "subgoal": "subgoal text or {UNASSIGNED_SUBGOAL}"}}
+        ]
+    }}
+    """
     
-    Unassigned:
-    - STORY-ABC: Story Summary
+    try:
+        assignments = generate_text(prompt, parse=parse_assignments)
+    except ValueError as e:
+        # One unreadable batch should not fail the report; its stories end up under Unassigned
+        print(f"Could not parse the assignments of a batch of {len(stories)} stories: {str(e)}")
+        return {}
+    return {
+        str(assignment.get('story_id')): str(assignment.get('subgoal') or UNASSIGNED_SUBGOAL).strip()
+        for assignment in assignments
+    }
+
+def merge_story_assignments(stories, subgoals, assigned):
+    """Group stories under their subgoals in subgoal order, with unmatched stories under Unassigned.
+
+    Assigned subgoals from the embedding and Gemini paths are mapped onto the lines of
+    parse_subgoal_lines, ignoring list markers, spacing and case, so one subgoal always
+    forms one group; anything that matches no line goes to Unassigned.
+    """
+    subgoal_lines = parse_subgoal_lines(subgoals)
+    canonical = {}
+    for line in subgoal_lines:
+        canonical.setdefault(' '.join(line.split()).casefold(), line)
+    
+    def match(subgoal):
+        lines = parse_subgoal_lines(subgoal)
+        return canonical.get(' '.join(lines[0].split()).casefold(), UNASSIGNED_SUBGOAL) if lines else UNASSIGNED_SUBGOAL
+    
+    groups = {}
+    for story in stories:
+        subgoal = match(assigned.get(story['key']))
+        group = groups.setdefault(subgoal, {'subgoal': subgoal, 'stories': []})
+        group['stories'].append({'key': story['key'], 'summary': story['summary']})
+    
+    order = {line: position for position, line in reversed(list(enumerate(subgoal_lines)))}
+    return sorted(groups.values(), key=lambda group: order.get(group['subgoal'], len(order)))
+
+def assign_stories_to_subgoals(stories, subgoals, batch_size=None, workers=None):
+    """Assign stories to subgoals in batches sent to Gemini in parallel and merge the results.
+
+    Stories that clearly match one subgoal by embedding similarity are assigned locally
+    and only the rest go to Gemini. Returns a list of {'subgoal', 'stories': [{'key',
+    'summary'}]} groups. Every story appears exactly once; stories the model skipped end
+    up under Unassigned.
     """
+    assigned = preassign_stories_by_embedding(stories, subgoals) if EMBEDDING_PREASSIGN else {}
+    remaining = [story for story in stories if story['key'] not in assigned]
+    
+    batch_size = batch_size or ASSIGNMENT_BATCH_SIZE
+    batches = [remaining[i:i + batch_size] for i in range(0, len(remaining), batch_size)]
+    
+    for batch_assignments in map_concurrently(
+        lambda batch: assign_story_batch(batch, subgoals), batches, workers or ASSIGNMENT_WORKERS
+    ):
+        assigned.update(batch_assignments)
     
-    response = model.generate_content(prompt)
-    return response.text
+    print(f"Assigned {len(remaining)} stories to subgoals in {len(batches)} Gemini batches")
+    return merge_story_assignments(stories, subgoals, assigned)
 
 def generate_achievements(stories, subgoals):
     # Create a detailed prompt for analyzing stories and generating achievements
@@ -287,8 +1434,233 @@ def generate_achievements(stories, subgoals):
     - Do not add any additional formatting
     """
     
-    response = model.generate_content(prompt)
-    return response.text
+    return generate_text(prompt)
+
+# Stored sprint reports, so downloads render exactly what was computed for the screen
+REPORT_ARTIFACT_TTL_SECONDS = float(os.getenv('REPORT_ARTIFACT_TTL_SECONDS', str(7 * 24 * 3600)))
+REPORT_ARTIFACT_MAX_MB = float(os.getenv('REPORT_ARTIFACT_MAX_MB', '256'))
+
+report_artifact_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'report_artifacts.sqlite3'),
+    ttl_seconds=REPORT_ARTIFACT_TTL_SECONDS,
+    max_bytes=int(REPORT_ARTIFACT_MAX_MB * 1024 * 1024)
+)
+
+def iter_sprint_report(sprint_id, refresh=False):
+    """Build the sprint report step by step, yielding (section, report) as each part is ready.
+
+    Sections are 'header' (sprint details and stories), 'subgoals', 'story_assignments'
+    and 'achievements'; the finished report is stored as an artifact before the last
+    one is yielded. Yields nothing when the sprint does not exist.
+    """
+    fetch_stats = new_fetch_stats()
+    with jira_pool.client() as jira_client:
+        # Get sprint details
+        sprint = call_jira_with_backoff(jira_client.sprint, sprint_id)
+        if not sprint:
+            return
+        
+        # Subgoal assignment and achievements do not look at the changelogs
+        stories = load_sprint_stories(jira_client, sprint, fetch_stats, refresh=refresh, include_changelog=False)
+    
+    report = {
+        'report_id': uuid.uuid4().hex,
+        'sprint_id': str(sprint_id),
+        'sprint_name': sprint.name,
+        'sprint_goal': sprint.goal if hasattr(sprint, 'goal') else "No sprint goal found",
+        'subgoals': None,
+        'stories': stories,
+        'story_assignments': None,
+        'achievements': None,
+        'start_date': sprint.startDate,
+        'end_date': sprint.endDate,
+        'jira_round_trips': fetch_stats['jira_round_trips'],
+        'snapshot_cache': fetch_stats.get('snapshot_cache')
+    }
+    yield 'header', report
+    
+    # Generate subgoals using Gemini
+    report['subgoals'] = generate_subgoals(report['sprint_goal'])
+    yield 'subgoals', report
+    
+    # Assign stories to subgoals
+    report['story_assignments'] = assign_stories_to_subgoals(stories, report['subgoals'])
+    yield 'story_assignments', report
+    
+    # Generate achievements for each subgoal
+    report['achievements'] = generate_achievements(stories, report['subgoals'])
+    report_artifact_cache.put(report['report_id'], report)
+    yield 'achievements', report
+
+def compute_sprint_report(sprint_id, refresh=False):
+    """Build the sprint report JSON and store it as an artifact under a new report id.
+
+    Returns None when the sprint does not exist.
+    """
+    report = None
+    for _, report in iter_sprint_report(sprint_id, refresh=refresh):
+        pass
+    return report
+
+def get_report_artifact(report_id):
+    """Return a previously computed sprint report, or None if it is unknown or expired."""
+    cached = report_artifact_cache.get(report_id)
+    return cached['value'] if cached else None
+
+def render_sprint_report_doc(report):
+    """Render a stored sprint report as a Word document."""
+    # Create a new Word document
+    doc = Document()
+    
+    # Add title
+    title = doc.add_heading(f'Sprint Report: {report["sprint_name"]}', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # Add sprint dates
+    dates = doc.add_paragraph()
+    dates.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    dates.add_run(f'{report["start_date"]} - {report["end_date"]}').italic = True
+    
+    # Add sprint goal
+    doc.add_heading('Sprint Goal', level=1)
+    doc.add_paragraph(report['sprint_goal'])
+    
+    # Add achievements and story assignments
+    doc.add_heading('Achievements and Story Assignments', level=1)
+    
+    # Process achievements
+    achievement_sections = report['achievements'].split('\n\n')
+    
+    for section in achievement_sections:
+        if not section.strip():
+            continue
+            
+        lines = section.split('\n')
+        if not lines:
+            continue
+            
+        # Add subgoal heading
+        doc.add_heading(lines[0], level=2)
+        
+        # Add story numbers if available
+        story_numbers = next((line for line in lines if line.startswith('Story Numbers:')), None)
+        if story_numbers:
+            doc.add_paragraph(story_numbers)
+        
+        # Add achievements subheading
+        doc.add_heading('Achievements', level=3)
+        
+        # Add achievements
+        for line in lines:
+            if line.startswith('- '):
+                p = doc.add_paragraph()
+                p.style = 'List Bullet'
+                p.add_run(line[2:])
+        
+        # Add a small space between subgoals
+        doc.add_paragraph()
+    
+    return doc
+
+# Story pages of the streamed report and the paginated stories endpoint
+STORY_PAGE_SIZE = int(os.getenv('STORY_PAGE_SIZE', '50'))
+MAX_STORY_PAGE_SIZE = int(os.getenv('MAX_STORY_PAGE_SIZE', '500'))
+
+STORY_RESPONSE_FIELDS = (
+    'key', 'summary', 'description', 'status', 'type', 'priority', 'assignee', 'reporter', 'created', 'updated',
+    'resolution', 'labels', 'components', 'story_points', 'epic_link', 'subtasks', 'changelog', 'comments', 'blockers'
+)
+
+def parse_story_fields(fields_param):
+    """Parse a comma separated `fields` parameter; None selects every story field."""
+    if not fields_param:
+        return None
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in STORY_RESPONSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown story fields: {', '.join(unknown)}")
+    return fields
+
+def parse_page_args(default_limit=None):
+    """Read offset and limit from the query string, capping limit at MAX_STORY_PAGE_SIZE."""
+    offset = int(request.args.get('offset', 0))
+    limit = int(request.args.get('limit', default_limit or STORY_PAGE_SIZE))
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    return offset, min(limit, MAX_STORY_PAGE_SIZE)
+
+def select_story_fields(stories, fields):
+    """Project stories onto the requested fields, keeping them whole when fields is None."""
+    if fields is None:
+        return stories
+    return [{field: story[field] for field in fields} for story in stories]
+
+def summarize_stories(stories):
+    """Story counts and points overall and per status, for the first screen of the report."""
+    by_status = {}
+    for story in stories:
+        status = by_status.setdefault(story['status'], {'count': 0, 'points': 0})
+        status['count'] += 1
+        status['points'] += to_number(story['story_points'])
+    return {
+        'total_stories': len(stories),
+        'total_points': sum(status['points'] for status in by_status.values()),
+        'completed_stories': by_status.get('Done', {}).get('count', 0),
+        'completed_points': by_status.get('Done', {}).get('points', 0),
+        'by_status': by_status
+    }
+
+def stream_sprint_report(sprint_id, refresh=False, fields=None, page_size=None):
+    """Yield the sprint report as NDJSON lines: header, summary, LLM sections, then story pages."""
+    def line(section, **payload):
+        return json.dumps(dict(payload, section=section), default=str) + '\n'
+    
+    try:
+        report = None
+        for section, report in iter_sprint_report(sprint_id, refresh=refresh):
+            if section == 'header':
+                yield line('header', **{key: report[key] for key in (
+                    'report_id', 'sprint_id', 'sprint_name', 'sprint_goal', 'start_date', 'end_date',
+                    'jira_round_trips', 'snapshot_cache'
+                )})
+                yield line('summary', **summarize_stories(report['stories']))
+            else:
+                yield line(section, **{section: report[section]})
+        
+        if report is None:
+            yield line('error', error='Sprint not found')
+            return
+        
+        stories = report['stories']
+        page_size = page_size or STORY_PAGE_SIZE
+        for offset in range(0, len(stories), page_size):
+            page = stories[offset:offset + page_size]
+            # The report snapshot has no changelogs, so they are loaded page by page when asked for
+            if fields is None or 'changelog' in fields:
+                with jira_pool.client() as jira_client:
+                    page = add_changelogs(jira_client, page)
+            yield line(
+                'stories', offset=offset, total=len(stories),
+                stories=select_story_fields(page, fields)
+            )
+        yield line('end', report_id=report['report_id'])
+    except Exception as e:
+        # Headers are already sent, so errors are reported in the stream itself
+        yield line('error', error=str(e))
+
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    try:
+        return jsonify({
+            'sprint_snapshots': sprint_snapshot_cache.stats(),
+            'llm_responses': llm_response_cache.stats(),
+            'report_artifacts': report_artifact_cache.stats(),
+            'embeddings': embedding_cache.stats(),
+            'capacity_sheets': capacity_cache.stats(),
+            'jira_lists': jira_list_cache.stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/sprint-report', methods=['GET'])
 def get_sprint_report():
@@ -298,38 +1670,59 @@ def get_sprint_report():
         
         if not board_id or not sprint_id:
             return jsonify({'error': 'Board ID and Sprint ID are required'}), 400
-
-        jira_client = get_jira_client()
         
-        # Get sprint details
-        sprint = jira_client.sprint(sprint_id)
-        if not sprint:
+        refresh = request.args.get('refresh') == 'true'
+        if request.args.get('stream') == 'true':
+            try:
+                fields = parse_story_fields(request.args.get('fields'))
+                _, page_size = parse_page_args()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return Response(
+                stream_with_context(stream_sprint_report(sprint_id, refresh, fields, page_size)),
+                mimetype='application/x-ndjson'
+            )
+
+        report = compute_sprint_report(sprint_id, refresh=refresh)
+        if not report:
             return jsonify({'error': 'Sprint not found'}), 404
         
-        # Get sprint goal
-        sprint_goal = sprint.goal if hasattr(sprint, 'goal') else "No sprint goal found"
-        
-        # Generate subgoals using Gemini
-        subgoals = generate_subgoals(sprint_goal)
-        
-        # Get stories from the sprint
-        stories = get_sprint_stories(jira_client, sprint_id)
-        
-        # Assign stories to subgoals
-        story_assignments = assign_stories_to_subgoals(stories, subgoals)
+        return jsonify(report)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sprint-stories', methods=['GET'])
+def get_sprint_stories_page():
+    try:
+        sprint_id = request.args.get('sprintId')
+        if not sprint_id:
+            return jsonify({'error': 'Sprint ID is required'}), 400
         
-        # Generate achievements for each subgoal
-        achievements = generate_achievements(stories, subgoals)
+        try:
+            fields = parse_story_fields(request.args.get('fields'))
+            offset, limit = parse_page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with jira_pool.client() as jira_client:
+            sprint = call_jira_with_backoff(jira_client.sprint, sprint_id)
+            if not sprint:
+                return jsonify({'error': 'Sprint not found'}), 404
+            stories = load_sprint_stories(
+                jira_client, sprint, refresh=request.args.get('refresh') == 'true', include_changelog=False
+            )
+            page = stories[offset:offset + limit]
+            # Changelogs are only loaded when they are asked for, and only for this page
+            if fields is None or 'changelog' in fields:
+                page = add_changelogs(jira_client, page)
         
         return jsonify({
-            'sprint_name': sprint.name,
-            'sprint_goal': sprint_goal,
-            'subgoals': subgoals,
-            'stories': stories,
-            'story_assignments': story_assignments,
-            'achievements': achievements,
-            'start_date': sprint.startDate,
-            'end_date': sprint.endDate
+            'sprint_id': str(sprint_id),
+            'total': len(stories),
+            'offset': offset,
+            'limit': limit,
+            'stories': select_story_fields(page, fields)
         })
     
     except Exception as e:
@@ -338,85 +1731,24 @@ def get_sprint_report():
 @app.route('/api/sprint-report/download', methods=['GET'])
 def download_sprint_report():
     try:
+        report_id = request.args.get('reportId')
         board_id = request.args.get('boardId')
         sprint_id = request.args.get('sprintId')
         
-        if not board_id or not sprint_id:
-            return jsonify({'error': 'Board ID and Sprint ID are required'}), 400
-
-        jira_client = get_jira_client()
-        
-        # Get sprint details
-        sprint = jira_client.sprint(sprint_id)
-        if not sprint:
-            return jsonify({'error': 'Sprint not found'}), 404
-        
-        # Get sprint goal
-        sprint_goal = sprint.goal if hasattr(sprint, 'goal') else "No sprint goal found"
-        
-        # Generate subgoals using Gemini
-        subgoals = generate_subgoals(sprint_goal)
-        
-        # Get stories from the sprint
-        stories = get_sprint_stories(jira_client, sprint_id)
-        
-        # Assign stories to subgoals
-        story_assignments = assign_stories_to_subgoals(stories, subgoals)
-        
-        # Generate achievements for each subgoal
-        achievements = generate_achievements(stories, subgoals)
-
-        # Create a new Word document
-        doc = Document()
-        
-        # Add title
-        title = doc.add_heading(f'Sprint Report: {sprint.name}', 0)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add sprint dates
-        dates = doc.add_paragraph()
-        dates.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        dates.add_run(f'{sprint.startDate} - {sprint.endDate}').italic = True
-        
-        # Add sprint goal
-        doc.add_heading('Sprint Goal', level=1)
-        doc.add_paragraph(sprint_goal)
-        
-        # Add achievements and story assignments
-        doc.add_heading('Achievements and Story Assignments', level=1)
-        
-        # Process achievements and story assignments
-        achievement_sections = achievements.split('\n\n')
-        assignment_sections = story_assignments.split('\n\n')
-        
-        for section in achievement_sections:
-            if not section.strip():
-                continue
-                
-            lines = section.split('\n')
-            if not lines:
-                continue
-                
-            # Add subgoal heading
-            subgoal_heading = doc.add_heading(lines[0], level=2)
-            
-            # Add story numbers if available
-            story_numbers = next((line for line in lines if line.startswith('Story Numbers:')), None)
-            if story_numbers:
-                doc.add_paragraph(story_numbers)
-            
-            # Add achievements subheading
-            doc.add_heading('Achievements', level=3)
-            
-            # Add achievements
-            for line in lines:
-                if line.startswith('- '):
-                    p = doc.add_paragraph()
-                    p.style = 'List Bullet'
-                    p.add_run(line[2:])
+        if report_id:
+            # Render the report the user is already looking at
+            report = get_report_artifact(report_id)
+            if not report:
+                return jsonify({'error': 'Report not found or expired'}), 404
+        else:
+            if not board_id or not sprint_id:
+                return jsonify({'error': 'Report ID, or Board ID and Sprint ID are required'}), 400
             
-            # Add a small space between subgoals
-            doc.add_paragraph()
+            report = compute_sprint_report(sprint_id, refresh=request.args.get('refresh') == 'true')
+            if not report:
+                return jsonify({'error': 'Sprint not found'}), 404
+        
+        doc = render_sprint_report_doc(report)
         
         # Save the document to a BytesIO object
         doc_io = io.BytesIO()
@@ -427,144 +1759,634 @@ def download_sprint_report():
             doc_io,
             mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
             as_attachment=True,
-            download_name=f'sprint_report_{sprint.name}.docx'
+            download_name=f'sprint_report_{report["sprint_name"]}.docx'
         )
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def process_excel_data(excel_file):
-    """Process Excel file and extract relevant information using LLM."""
+# Capacity sheet templates parsed without the LLM. Header aliases are matched case-insensitively,
+# ignoring a trailing "(hours)" style unit; CAPACITY_COLUMN_MAPPING adds aliases as JSON,
+# e.g. {"name": ["Engineer"], "capacity": ["Avail."]}. Headers that also appear in issue
+# exports (assignee, story points) are left out so such exports are not read as capacity.
+CAPACITY_COLUMN_ALIASES = {
+    'name': ['name', 'team member', 'member', 'resource', 'engineer', 'developer'],
+    'capacity': ['capacity', 'availability', 'available', 'available hours', 'available days', 'hours', 'days'],
+    'unit': ['unit', 'units']
+}
+for role, aliases in json.loads(os.getenv('CAPACITY_COLUMN_MAPPING', '{}')).items():
+    CAPACITY_COLUMN_ALIASES.setdefault(role, [])[:0] = [alias.strip().casefold() for alias in aliases]
+
+CAPACITY_DEFAULT_UNIT = os.getenv('CAPACITY_DEFAULT_UNIT', 'points')
+CAPACITY_HOURS_PER_DAY = float(os.getenv('CAPACITY_HOURS_PER_DAY', '8'))
+# Rows searched for the header row, which may sit below a title block
+CAPACITY_HEADER_SCAN_ROWS = 10
+# Uploaded workbooks over these limits are rejected before they are parsed
+EXCEL_MAX_UPLOAD_MB = float(os.getenv('EXCEL_MAX_UPLOAD_MB', '10'))
+EXCEL_MAX_ROWS = int(os.getenv('EXCEL_MAX_ROWS', '5000'))
+# Flask stops reading request bodies well beyond the upload limit (the margin covers the other form fields)
+app.config['MAX_CONTENT_LENGTH'] = int((EXCEL_MAX_UPLOAD_MB + 1) * 1024 * 1024)
+CAPACITY_UNITS = {
+    'h': 'hours', 'hr': 'hours', 'hrs': 'hours', 'hour': 'hours', 'hours': 'hours',
+    'd': 'days', 'day': 'days', 'days': 'days',
+    'pt': 'points', 'pts': 'points', 'point': 'points', 'points': 'points', 'sp': 'points'
+}
+
+capacity_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'capacity_sheets.sqlite3'),
+    ttl_seconds=float(os.getenv('CAPACITY_CACHE_TTL_SECONDS', str(30 * 24 * 3600))),
+    max_bytes=32 * 1024 * 1024
+)
+
+def normalize_capacity_unit(value):
+    """Map unit spellings such as 'hrs' or 'Days' to hours, days or points; None if unknown."""
+    text = str(value).strip().casefold() if value is not None else ''
+    if text in CAPACITY_UNITS:
+        return CAPACITY_UNITS[text]
+    for word in re.findall(r'[a-z]+', text):
+        if word in CAPACITY_UNITS and len(word) > 2:
+            return CAPACITY_UNITS[word]
+    return None
+
+def find_capacity_columns(header_rows):
+    """Locate the header row and the name, capacity and unit columns of a capacity sheet.
+
+    header_rows are the first rows of the sheet as value tuples. Returns
+    (header_row, columns, header_unit) or None if the sheet does not match.
+    """
+    for header_row, cells in enumerate(header_rows):
+        headers = {}
+        for column, cell in enumerate(cells):
+            if isinstance(cell, str) and cell.strip():
+                header = ' '.join(cell.split()).casefold()
+                base = re.sub(r'\s*\(.*\)\s*$', '', header)
+                headers.setdefault(base, (column, header))
+        
+        columns = {}
+        for role, aliases in CAPACITY_COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in headers:
+                    columns[role] = headers[alias]
+                    break
+        if 'name' in columns and 'capacity' in columns:
+            header_unit = normalize_capacity_unit(columns['capacity'][1])
+            return header_row, {role: column for role, (column, _) in columns.items()}, header_unit
+    return None
+
+def iter_workbook_sheets(content, file_name=''):
+    """Yield (sheet_name, read_rows) for every sheet of an uploaded workbook.
+
+    read_rows(min_row, max_row=None, min_col=1, max_col=None) iterates value tuples with
+    1-based bounds like openpyxl. .xlsx files are streamed in openpyxl's read-only mode,
+    so only the requested cells are materialized; legacy .xls files go through pandas.
+    """
+    if file_name.lower().endswith('.xls'):
+        for sheet_name, frame in pd.read_excel(
+            io.BytesIO(content), sheet_name=None, header=None, nrows=EXCEL_MAX_ROWS + CAPACITY_HEADER_SCAN_ROWS + 1
+        ).items():
+            frame = frame.astype(object).where(frame.notna(), None)
+            
+            def read_rows(min_row, max_row=None, min_col=1, max_col=None, frame=frame):
+                block = frame.iloc[min_row - 1:max_row, min_col - 1:max_col]
+                return block.itertuples(index=False, name=None)
+            
+            yield sheet_name, read_rows
+        return
+    
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
     try:
-        # Read Excel file
-        df = pd.read_excel(excel_file)
-        
-        # Convert DataFrame to string representation
-        excel_data = df.to_string()
-        
-        # Create prompt for LLM to extract structured data
-        prompt = f"""
-        Analyze the following Excel data and extract the following information in a structured format:
-        1. Sprint Capacity
-        2. Team Member Capacities
-        3. Story Details (including subtasks)
-        4. Changelogs
-        5. Blockers/Impediments
-        
-        Excel Data:
-        {excel_data}
-        
-        Return the data in this JSON format:
-        {{
-            "sprint_capacity": {{
-                "total_capacity": number,
-                "unit": "hours/days"
-            }},
-            "team_members": [
-                {{
-                    "name": string,
-                    "capacity": number,
-                    "unit": "hours/days"
-                }}
-            ],
-            "stories": [
-                {{
-                    "id": string,
-                    "summary": string,
-                    "description": string,
-                    "status": string,
-                    "assignee": string,
-                    "subtasks": [
-                        {{
-                            "id": string,
-                            "summary": string,
-                            "status": string,
-                            "assignee": string
-                        }}
-                    ],
-                    "changelog": [
-                        {{
-                            "date": string,
-                            "field": string,
-                            "from": string,
-                            "to": string
-                        }}
-                    ],
-                    "blockers": [
-                        {{
-                            "description": string,
-                            "resolution": string
-                        }}
-                    ]
-                }}
-            ]
-        }}
-        
-        Important: Return ONLY the JSON object, with no additional text or explanation.
-        """
-        
-        response = model.generate_content(prompt)
-        
-        # Clean the response text to ensure it's valid JSON
-        response_text = response.text.strip()
-        
-        # Remove any markdown code block indicators if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
+        for worksheet in workbook.worksheets:
+            def read_rows(min_row, max_row=None, min_col=1, max_col=None, worksheet=worksheet):
+                return worksheet.iter_rows(
+                    min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col, values_only=True
+                )
             
-        response_text = response_text.strip()
+            yield worksheet.title, read_rows
+    finally:
+        workbook.close()
+
+def parse_capacity_sheets(sheets):
+    """Build structured capacity data from every sheet that matches a known template.
+
+    sheets yields (sheet_name, read_rows) pairs as from iter_workbook_sheets; below the
+    header only the name, capacity and unit columns are read. A sheet that lists a name
+    twice is a per-item export rather than a capacity template and is skipped. Members
+    listed on several sheets have their capacities added up. Returns None when no sheet matches, so the
+    caller can fall back to the LLM.
+    """
+    rows = []
+    for sheet_name, read_rows in sheets:
+        layout = find_capacity_columns(list(read_rows(1, CAPACITY_HEADER_SCAN_ROWS)))
+        if not layout:
+            continue
+        header_row, columns, header_unit = layout
+        first_column = min(columns.values())
+        offsets = {role: column - first_column for role, column in columns.items()}
+        
+        body = read_rows(header_row + 2, min_col=first_column + 1, max_col=max(columns.values()) + 1)
+        sheet_rows = []
+        for count, row in enumerate(body):
+            if count >= EXCEL_MAX_ROWS:
+                raise Exception(f"Sheet '{sheet_name}' has more than {EXCEL_MAX_ROWS} rows")
+            values = {role: row[offset] if offset < len(row) else None for role, offset in offsets.items()}
+            name = values['name']
+            if not isinstance(name, str) or not name.strip() or name.strip().casefold() in ('total', 'sum', 'team total'):
+                continue
+            unit = normalize_capacity_unit(values['unit']) if 'unit' in values else None
+            capacity = values['capacity']
+            sheet_rows.append({
+                'name': ' '.join(name.split()),
+                'capacity': to_number(None if pd.isna(capacity) else capacity),
+                'unit': unit or header_unit or CAPACITY_DEFAULT_UNIT
+            })
         
-        try:
-            structured_data = json.loads(response_text)
-            return structured_data
-        except json.JSONDecodeError as e:
-            # If JSON parsing fails, try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    structured_data = json.loads(json_match.group())
-                    return structured_data
-                except json.JSONDecodeError:
-                    raise Exception(f"Failed to parse JSON from response: {str(e)}")
-            else:
-                raise Exception(f"Failed to extract JSON from response: {str(e)}")
-                
+        names = [row['name'].casefold() for row in sheet_rows]
+        if len(set(names)) < len(names):
+            print(f"Sheet '{sheet_name}' repeats member names, not parsing it as a capacity sheet")
+            continue
+        rows.extend(sheet_rows)
+        print(f"Parsed capacity sheet '{sheet_name}' locally")
+    
+    if not rows:
+        return None
+    
+    units = {row['unit'] for row in rows}
+    if units == {'hours', 'days'}:
+        # Bring mixed time units to hours so capacities add up
+        for row in rows:
+            if row['unit'] == 'days':
+                row['capacity'] = to_number(row['capacity'] * CAPACITY_HOURS_PER_DAY)
+                row['unit'] = 'hours'
+        units = {'hours'}
+    
+    members = {}
+    for row in rows:
+        member = members.setdefault((row['name'].casefold(), row['unit']), dict(row, capacity=0))
+        member['capacity'] = to_number(member['capacity'] + row['capacity'])
+    team_members = list(members.values())
+    
+    return {
+        'sprint_capacity': {
+            'total_capacity': sum(member['capacity'] for member in team_members),
+            'unit': units.pop() if len(units) == 1 else 'mixed'
+        },
+        'team_members': team_members,
+        'stories': []
+    }
+
+def check_excel_upload(excel_file):
+    """Check an uploaded workbook against the size and row limits without parsing its cells.
+
+    Returns (error message, HTTP status), or None if the file is within the limits.
+    """
+    excel_file.seek(0, os.SEEK_END)
+    size = excel_file.tell()
+    excel_file.seek(0)
+    if size > EXCEL_MAX_UPLOAD_MB * 1024 * 1024:
+        return f"Excel file is larger than {EXCEL_MAX_UPLOAD_MB:g} MB", 413
+    
+    if not excel_file.filename.lower().endswith('.xlsx'):
+        return None
+    # Read-only workbooks report each sheet's dimensions without loading its rows
+    try:
+        workbook = openpyxl.load_workbook(excel_file, read_only=True)
+    except Exception as e:
+        excel_file.seek(0)
+        return f"Invalid Excel file: {str(e)}", 400
+    try:
+        for worksheet in workbook.worksheets:
+            if (worksheet.max_row or 0) > EXCEL_MAX_ROWS + CAPACITY_HEADER_SCAN_ROWS:
+                return f"Sheet '{worksheet.title}' has more than {EXCEL_MAX_ROWS} rows", 413
+    finally:
+        workbook.close()
+        excel_file.seek(0)
+    return None
+
+def process_excel_data(excel_file):
+    """Extract team capacities from the uploaded sheet.
+
+    Known templates are parsed locally; other layouts are sent to the LLM. Results are
+    cached by file content and column mapping, so re-uploads of the same file are free.
+    """
+    try:
+        content = excel_file.read()
+        cache_key = hashlib.sha256(
+            content + json.dumps(CAPACITY_COLUMN_ALIASES, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        cached = capacity_cache.get(cache_key)
+        if cached:
+            return cached['value']
+        
+        structured_data = parse_capacity_sheets(iter_workbook_sheets(content, getattr(excel_file, 'filename', None) or ''))
+        source = 'template'
+        if structured_data is None:
+            print("Excel file does not match a known capacity template, extracting it with the LLM")
+            structured_data = extract_excel_data_with_llm(pd.read_excel(io.BytesIO(content), nrows=EXCEL_MAX_ROWS))
+            source = 'llm'
+        
+        capacity_cache.put(cache_key, structured_data, tag=source)
+        return structured_data
     except Exception as e:
         raise Exception(f"Error processing Excel file: {str(e)}")
 
+def extract_excel_data_with_llm(df):
+    """Extract capacity and story information from an unrecognized sheet using the LLM."""
+    # Convert DataFrame to string representation
+    excel_data = df.to_string()
+    
+    # Create prompt for LLM to extract structured data
+    prompt = f"""
+    Analyze the following Excel data and extract the following information in a structured format:
+    1. Sprint Capacity
+    2. Team Member Capacities
+    3. Story Details (including subtasks)
+    4. Changelogs
+    5. Blockers/Impediments
+    
+    Excel Data:
+    {excel_data}
+    
+    Return the data in this JSON format:
+    {{
+        "sprint_capacity": {{
+            "total_capacity": number,
+            "unit": "hours/days"
+        }},
+        "team_members": [
+            {{
+                "name": string,
+                "capacity": number,
+                "unit": "hours/days"
+            }}
+        ],
+        "stories": [
+            {{
+                "id": string,
+                "summary": string,
+                "description": string,
+                "status": string,
+                "assignee": string,
+                "subtasks": [
+                    {{
+                        "id": string,
+                        "summary": string,
+                        "status": string,
+                        "assignee": string
+                    }}
+                ],
+                "changelog": [
+                    {{
+                        "date": string,
+                        "field": string,
+                        "from": string,
+                        "to": string
+                    }}
+                ],
+                "blockers": [
+                    {{
+                        "description": string,
+                        "resolution": string
+                    }}
+                ]
+            }}
+        ]
+    }}
+    
+    Important: Return ONLY the JSON object, with no additional text or explanation.
+    """
+    
+    return generate_text(prompt, parse=parse_json_response)
+
+JIRA_DATETIME_CACHE_SIZE = int(os.getenv('JIRA_DATETIME_CACHE_SIZE', '65536'))
+
+# Fallback for timestamps that are not in Jira's fixed-width changelog format
+JIRA_DATETIME_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?(Z|[+-]\d{2}:?\d{2})?$'
+)
+
+_utc_offsets = {}
+
+def get_utc_offset(offset):
+    """Return the timedelta for a '+0530' / '-07:00' style offset, building each one only once."""
+    delta = _utc_offsets.get(offset)
+    if delta is None:
+        digits = offset[1:].replace(':', '')
+        delta = timedelta(hours=int(digits[:2]), minutes=int(digits[2:4]))
+        if offset[0] == '-':
+            delta = -delta
+        _utc_offsets[offset] = delta
+    return delta
+
+@lru_cache(maxsize=JIRA_DATETIME_CACHE_SIZE)
 def parse_jira_datetime(datetime_str):
-    """Parse Jira datetime string to datetime object."""
+    """Parse a Jira timestamp such as 2025-05-16T15:38:57.738+0530 into a UTC-aware datetime.
+
+    Positive and negative offsets and 'Z' are converted to UTC; timestamps without an
+    offset are taken as UTC. Results are memoized since every analytics pass parses
+    the same changelog dates. Returns None for blank or unparseable values.
+    """
+    if not datetime_str:
+        return None
     try:
-        if not datetime_str:
+        if len(datetime_str) == 28 and datetime_str[23] in '+-':
+            # Fast path for YYYY-MM-DDTHH:MM:SS.mmm±HHMM
+            dt = datetime(
+                int(datetime_str[0:4]), int(datetime_str[5:7]), int(datetime_str[8:10]),
+                int(datetime_str[11:13]), int(datetime_str[14:16]), int(datetime_str[17:19]),
+                int(datetime_str[20:23]) * 1000, tzinfo=timezone.utc
+            )
+            return dt - get_utc_offset(datetime_str[23:])
+        
+        match = JIRA_DATETIME_PATTERN.match(datetime_str)
+        if not match:
             return None
-            
-        # Handle different Jira datetime formats
-        if '+' in datetime_str:
-            # Format: 2025-05-16T15:38:57.738+0530
-            dt_str, offset = datetime_str.split('+')
-            dt = datetime.fromisoformat(dt_str)
-            hours = int(offset[:2])
-            minutes = int(offset[2:4])
-            dt = dt - timedelta(hours=hours, minutes=minutes)
-        elif 'Z' in datetime_str:
-            # Format: 2025-05-16T15:38:57.738Z
-            dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-        else:
-            # Format: 2025-05-16T15:38:57.738
-            dt = datetime.fromisoformat(datetime_str)
-            
+        year, month, day, hour, minute, second, fraction, offset = match.groups()
+        dt = datetime(
+            int(year), int(month), int(day), int(hour), int(minute), int(second or 0),
+            int((fraction or '0').ljust(6, '0')), tzinfo=timezone.utc
+        )
+        if offset and offset != 'Z':
+            dt -= get_utc_offset(offset)
         return dt
-    except Exception as e:
+    except (TypeError, ValueError):
         return None
 
-def analyze_sprint_churn(sprint_data):
-    """Analyze sprint churn by examining story changes during the sprint."""
-    print(f"Analyzing sprint data: {json.dumps(sprint_data, indent=2)}")
+def benchmark_parse_jira_datetime(count=50000):
+    """Print the per-call cost of parse_jira_datetime for unique (cold) and repeated (memoized) timestamps.
+
+    Keep count below JIRA_DATETIME_CACHE_SIZE, otherwise the second pass evicts its own entries.
+    """
+    base = datetime(2025, 1, 1)
+    offsets = ['+0530', '-0700', '+0000', '-0330']
+    timestamps = [
+        (base + timedelta(seconds=i * 37, milliseconds=i % 1000)).strftime('%Y-%m-%dT%H:%M:%S.') +
+        f"{i % 1000:03d}{offsets[i % len(offsets)]}"
+        for i in range(count)
+    ]
+    
+    parse_jira_datetime.cache_clear()
+    started = time.perf_counter()
+    for timestamp in timestamps:
+        parse_jira_datetime(timestamp)
+    cold = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for timestamp in timestamps:
+        parse_jira_datetime(timestamp)
+    warm = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for timestamp in timestamps:
+        datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%f%z').astimezone(timezone.utc)
+    reference = time.perf_counter() - started
+    
+    print(f"parse_jira_datetime over {count} timestamps:")
+    print(f"  first parse: {cold / count * 1e6:.2f} us/call")
+    print(f"  memoized:    {warm / count * 1e6:.2f} us/call")
+    print(f"  strptime:    {reference / count * 1e6:.2f} us/call (reference)")
+    parse_jira_datetime.cache_clear()
+
+# Utilization (in percent of capacity) above or below which team members are flagged
+OVER_UTILIZATION_PERCENT = 100
+UNDER_UTILIZATION_PERCENT = 70
+
+def get_sprint_window(sprint_data):
+    """Return the sprint start and end as UTC datetimes."""
+    sprint_start = parse_jira_datetime(sprint_data['start_date'])
+    sprint_end = parse_jira_datetime(sprint_data['end_date'])
+    
+    if not sprint_start or not sprint_end:
+        raise Exception("Invalid sprint dates")
+    return sprint_start, sprint_end
+
+def build_changelog_index(sprint_data):
+    """Parse every changelog entry of the sprint's stories once and index it by story and field.
+
+    For each story key the index holds the parsed creation date, all entries as
+    (utc_datetime, change) pairs and the entries bucketed by field. Entries with
+    unparseable dates are skipped.
+    """
+    index = {}
+    for story in sprint_data['stories']:
+        entries = []
+        by_field = {}
+        events = [ChangelogEvent.from_dict(change) for change in story['changelog']]
+        for change in events:
+            change_date = parse_jira_datetime(change.date)
+            if not change_date:
+                continue
+            entries.append((change_date, change))
+            by_field.setdefault(change.field, []).append((change_date, change))
+        
+        index[story['key']] = {
+            'created': parse_jira_datetime(story['created']),
+            'entries': entries,
+            'by_field': by_field,
+            'has_sprint_changes': any(change.field == 'Sprint' for change in events)
+        }
+    return index
+
+def to_number(value):
+    """Turn a capacity or story point value into a number, treating blanks as 0."""
+    try:
+        number = float(value) if value not in (None, '') else 0.0
+    except (TypeError, ValueError):
+        return 0
+    return int(number) if number.is_integer() else number
+
+def calculate_sprint_numbers(sprint_data, structured_data=None, index=None):
+    """Compute every numeric sprint result in a single pass over the stories.
+
+    Returns committed and completed points for the sprint and per assignee, churn,
+    spillover and, when capacity data is given, utilization per team member. The LLM
+    only turns these numbers into narrative, so they are the same on every run.
+    Pass a changelog index from build_changelog_index to reuse it; otherwise one is built.
+    """
+    sprint_start, sprint_end = get_sprint_window(sprint_data)
+    sprint_name = sprint_data.get('sprint_name')
+    if index is None:
+        index = build_changelog_index(sprint_data)
+    
+    totals = {'committed': 0, 'completed': 0}
+    members = {}
+    story_flags = {}
+    churned_stories = []
+    spilled_stories = []
+    
+    for story in sprint_data['stories']:
+        story_points = story['story_points'] or 0
+        story_index = index[story['key']]
+        was_in_sprint_at_start = False
+        was_completed_during_sprint = False
+        churn_count = 0
+        removed_change = None
+        # Status at sprint end: the last status change up to the end, or the status
+        # the story left at its first change after the end
+        last_status_before_end = None
+        first_status_after_end = None
+        
+        for change_date, change in story_index['by_field'].get('Sprint', []):
+            if change_date <= sprint_start:
+                was_in_sprint_at_start = True
+            if sprint_start <= change_date <= sprint_end:
+                # Story was added to this sprint during the sprint
+                churn_count += 1
+                churned_stories.append({
+                    'story_id': story['key'],
+                    'summary': story['summary'],
+                    'added_date': change.date,
+                    'status': story['status'],
+                    'assignee': story['assignee'],
+                    'story_points': story['story_points'],
+                    'type': story['type']
+                })
+                if sprint_name and sprint_name in (change.from_value or '') and sprint_name not in (change.to_value or ''):
+                    removed_change = change
+        
+        for change_date, change in story_index['by_field'].get('status', []):
+            if change.to_value == 'Done' and sprint_start <= change_date <= sprint_end:
+                was_completed_during_sprint = True
+            if change_date <= sprint_end:
+                if not last_status_before_end or change_date >= last_status_before_end[0]:
+                    last_status_before_end = (change_date, change.to_value)
+            elif not first_status_after_end or change_date < first_status_after_end[0]:
+                first_status_after_end = (change_date, change.from_value)
+        
+        # If no sprint changes found, check creation date
+        if not story_index['has_sprint_changes']:
+            story_created = story_index['created']
+            if story_created and story_created <= sprint_start:
+                was_in_sprint_at_start = True
+        
+        if last_status_before_end:
+            status_at_end = last_status_before_end[1]
+        elif first_status_after_end:
+            status_at_end = first_status_after_end[1]
+        else:
+            status_at_end = story['status']
+        
+        if was_in_sprint_at_start:
+            totals['committed'] += story_points
+        if was_completed_during_sprint:
+            totals['completed'] += story_points
+        
+        assignee = story['assignee']
+        if assignee:
+            member = members.setdefault(assignee, {'committed': 0, 'completed': 0})
+            if was_in_sprint_at_start:
+                member['committed'] += story_points
+            if was_completed_during_sprint:
+                member['completed'] += story_points
+        
+        if removed_change:
+            reason = f"Moved from {removed_change.from_value} to {removed_change.to_value} on {removed_change.date}"
+        elif status_at_end != 'Done' and not was_completed_during_sprint:
+            reason = f"Not done by sprint end (status: {status_at_end})"
+        else:
+            reason = None
+        if reason:
+            spilled_stories.append({
+                'story_id': story['key'],
+                'summary': story['summary'],
+                'story_points': story_points,
+                'status_at_end': status_at_end,
+                'in_sprint_at_start': was_in_sprint_at_start,
+                'reason': reason
+            })
+        
+        story_flags[story['key']] = {
+            'story_points': story_points,
+            'in_sprint_at_start': was_in_sprint_at_start,
+            'completed_during_sprint': was_completed_during_sprint,
+            'status_at_end': status_at_end,
+            'churn_count': churn_count
+        }
+    
+    return {
+        'committed': totals['committed'],
+        'completed': totals['completed'],
+        'members': members,
+        'capacity': calculate_capacity(structured_data),
+        'utilization': calculate_utilization(structured_data, members),
+        'churn': summarize_churn(churned_stories),
+        'spillover': {
+            'spilled_stories': spilled_stories,
+            'total_spilled': len(spilled_stories),
+            'total_spilled_points': sum(s['story_points'] for s in spilled_stories if s['in_sprint_at_start'])
+        },
+        'stories': story_flags
+    }
+
+def calculate_capacity(structured_data):
+    """Sum the team members' capacity from the extracted Excel data."""
+    if not structured_data:
+        return 0
+    return sum(to_number(member.get('capacity')) for member in structured_data.get('team_members', []))
+
+def calculate_utilization(structured_data, members):
+    """Match team capacities to assignee points and compute utilization per member."""
+    team_members = structured_data.get('team_members', []) if structured_data else []
+    points_by_name = {name.strip().casefold(): data for name, data in members.items()}
+    
+    utilization = []
+    listed = set()
+    for team_member in team_members:
+        name = str(team_member.get('name') or '').strip()
+        if not name:
+            continue
+        listed.add(name.casefold())
+        capacity = to_number(team_member.get('capacity'))
+        points = points_by_name.get(name.casefold(), {'committed': 0, 'completed': 0})
+        utilization.append({
+            'member': name,
+            'capacity': capacity,
+            'committed': points['committed'],
+            'completed': points['completed'],
+            'utilization': round(points['completed'] / capacity * 100, 1) if capacity else None
+        })
+    
+    # Assignees who are missing from the capacity sheet
+    for name, points in members.items():
+        if name.strip().casefold() not in listed:
+            utilization.append({
+                'member': name,
+                'capacity': 0,
+                'committed': points['committed'],
+                'completed': points['completed'],
+                'utilization': None
+            })
+    return utilization
+
+def summarize_churn(churned_stories):
+    """Aggregate churned stories by type into the churn analysis structure."""
+    total_churned = len(churned_stories)
+    total_churned_points = sum(story['story_points'] for story in churned_stories if story['story_points'])
+    
+    churn_by_type = {
+        issue_type: {
+            'count': len([s for s in churned_stories if s['type'] == issue_type]),
+            'points': sum(s['story_points'] for s in churned_stories if s['type'] == issue_type and s['story_points'])
+        }
+        for issue_type in ('Story', 'Task', 'Bug')
+    }
+    
+    return {
+        'churned_stories': churned_stories,
+        'total_churned': total_churned,
+        'total_churned_points': total_churned_points,
+        'churn_by_type': churn_by_type,
+        'churn_summary': f"Total Churned Stories: {total_churned} ({total_churned_points} points)\n" +
+                        f"Stories: {churn_by_type['Story']['count']} ({churn_by_type['Story']['points']} points)\n" +
+                        f"Tasks: {churn_by_type['Task']['count']} ({churn_by_type['Task']['points']} points)\n" +
+                        f"Bugs: {churn_by_type['Bug']['count']} ({churn_by_type['Bug']['points']} points)"
+    }
+
+def analyze_sprint_churn(sprint_data, index=None):
+    """Analyze sprint churn by examining story changes during the sprint.
+
+    Pass a changelog index from build_changelog_index to reuse it; otherwise one is built.
+    """
+    print(f"Analyzing sprint churn for {len(sprint_data['stories'])} stories")
     
     # Extract and validate sprint dates
     sprint_start_str = sprint_data.get('start_date')
@@ -585,6 +2407,8 @@ def analyze_sprint_churn(sprint_data):
         raise Exception(f"Invalid sprint end date: {sprint_end_str}")
     
     print(f"Sprint period: {sprint_start} to {sprint_end}")
+    if index is None:
+        index = build_changelog_index(sprint_data)
     
     churn_analysis = {
         'added_stories': [],
@@ -605,38 +2429,39 @@ def analyze_sprint_churn(sprint_data):
             'assignee_changes': []
         }
         
+        story_index = index[story['key']]
+        
         # Analyze changelog entries within sprint dates
-        for change in story['changelog']:
-            change_date = parse_jira_datetime(change['date'])
-            if change_date and sprint_start <= change_date <= sprint_end:
-                if change['field'] == 'status':
+        for change_date, change in story_index['entries']:
+            if sprint_start <= change_date <= sprint_end:
+                if change.field == 'status':
                     story_changes['status_changes'].append({
-                        'date': change['date'],
-                        'from': change['from'],
-                        'to': change['to']
+                        'date': change.date,
+                        'from': change.from_value,
+                        'to': change.to_value
                     })
-                elif change['field'] == 'Story Points':
+                elif change.field == 'Story Points':
                     story_changes['point_changes'].append({
-                        'date': change['date'],
-                        'from': change['from'],
-                        'to': change['to']
+                        'date': change.date,
+                        'from': change.from_value,
+                        'to': change.to_value
                     })
-                elif change['field'] == 'assignee':
+                elif change.field == 'assignee':
                     story_changes['assignee_changes'].append({
-                        'date': change['date'],
-                        'from': change['from'],
-                        'to': change['to']
+                        'date': change.date,
+                        'from': change.from_value,
+                        'to': change.to_value
                     })
                 
                 story_changes['changes'].append({
-                    'date': change['date'],
-                    'field': change['field'],
-                    'from': change['from'],
-                    'to': change['to']
+                    'date': change.date,
+                    'field': change.field,
+                    'from': change.from_value,
+                    'to': change.to_value
                 })
         
         # Check if story was added during sprint
-        story_created = parse_jira_datetime(story['created'])
+        story_created = story_index['created']
         if story_created and sprint_start <= story_created <= sprint_end:
             churn_analysis['added_stories'].append({
                 'key': story['key'],
@@ -664,71 +2489,7 @@ def analyze_sprint_churn(sprint_data):
 
 def analyze_churned_stories(sprint_data):
     """Analyze stories that were added to the sprint after it started."""
-    churned_stories = []
-    sprint_start = parse_jira_datetime(sprint_data['start_date'])
-    sprint_end = parse_jira_datetime(sprint_data['end_date'])
-    
-    if not sprint_start or not sprint_end:
-        raise Exception("Invalid sprint dates")
-    
-    # Ensure both sprint dates are timezone-aware
-    utc = pytz.UTC
-    if sprint_start.tzinfo is None:
-        sprint_start = utc.localize(sprint_start)
-    if sprint_end.tzinfo is None:
-        sprint_end = utc.localize(sprint_end)
-    
-    for story in sprint_data['stories']:
-        # Check changelog for sprint changes
-        for change in story['changelog']:
-            if change['field'] == 'Sprint':
-                change_date = parse_jira_datetime(change['date'])
-                if change_date:
-                    # Ensure change date is timezone-aware
-                    if change_date.tzinfo is None:
-                        change_date = utc.localize(change_date)
-                    
-                    if sprint_start <= change_date <= sprint_end:
-                        # Story was added to this sprint during the sprint
-                        churned_stories.append({
-                            'story_id': story['key'],
-                            'summary': story['summary'],
-                            'added_date': change['date'],
-                            'status': story['status'],
-                            'assignee': story['assignee'],
-                            'story_points': story['story_points'],
-                            'type': story['type']
-                        })
-    
-    # Calculate churn metrics
-    total_churned = len(churned_stories)
-    total_churned_points = sum(story['story_points'] for story in churned_stories if story['story_points'])
-    
-    churn_by_type = {
-        'Story': {
-            'count': len([s for s in churned_stories if s['type'] == 'Story']),
-            'points': sum(s['story_points'] for s in churned_stories if s['type'] == 'Story' and s['story_points'])
-        },
-        'Task': {
-            'count': len([s for s in churned_stories if s['type'] == 'Task']),
-            'points': sum(s['story_points'] for s in churned_stories if s['type'] == 'Task' and s['story_points'])
-        },
-        'Bug': {
-            'count': len([s for s in churned_stories if s['type'] == 'Bug']),
-            'points': sum(s['story_points'] for s in churned_stories if s['type'] == 'Bug' and s['story_points'])
-        }
-    }
-    
-    return {
-        'churned_stories': churned_stories,
-        'total_churned': total_churned,
-        'total_churned_points': total_churned_points,
-        'churn_by_type': churn_by_type,
-        'churn_summary': f"Total Churned Stories: {total_churned} ({total_churned_points} points)\n" +
-                        f"Stories: {churn_by_type['Story']['count']} ({churn_by_type['Story']['points']} points)\n" +
-                        f"Tasks: {churn_by_type['Task']['count']} ({churn_by_type['Task']['points']} points)\n" +
-                        f"Bugs: {churn_by_type['Bug']['count']} ({churn_by_type['Bug']['points']} points)"
-    }
+    return calculate_sprint_numbers(sprint_data)['churn']
 
 def analyze_subgoal_improvements(stories, subgoal):
     """Analyze improvement areas for a specific subgoal based on its stories."""
@@ -791,220 +2552,216 @@ def analyze_subgoal_improvements(stories, subgoal):
     - Do not include any additional text or explanation
     """
     
-    response = model.generate_content(prompt)
-    
-    # Clean the response text to ensure it's valid JSON
-    response_text = response.text.strip()
-    
-    # Remove any markdown code block indicators if present
-    if response_text.startswith('```json'):
-        response_text = response_text[7:]
-    if response_text.startswith('```'):
-        response_text = response_text[3:]
-    if response_text.endswith('```'):
-        response_text = response_text[:-3]
-        
-    response_text = response_text.strip()
-    
     try:
-        # Try to parse the JSON directly
-        result = json.loads(response_text)
-        # Ensure we only return 2-3 improvements
-        if len(result['improvement_areas']) > 3:
-            result['improvement_areas'] = result['improvement_areas'][:3]
-        return result
-    except json.JSONDecodeError as e:
-        print(f"Initial JSON parsing failed: {str(e)}")
-        print(f"Raw response: {response_text}")
-        
-        # If direct parsing fails, try to extract JSON from the response
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            try:
-                extracted_json = json_match.group()
-                # Clean up any potential formatting issues
-                extracted_json = extracted_json.replace('\n', ' ').replace('\r', '')
-                extracted_json = re.sub(r',\s*}', '}', extracted_json)  # Remove trailing commas
-                extracted_json = re.sub(r',\s*]', ']', extracted_json)  # Remove trailing commas in arrays
-                result = json.loads(extracted_json)
-                # Ensure we only return 2-3 improvements
-                if len(result['improvement_areas']) > 3:
-                    result['improvement_areas'] = result['improvement_areas'][:3]
-                return result
-            except json.JSONDecodeError as e2:
-                print(f"Extracted JSON parsing failed: {str(e2)}")
-                print(f"Extracted JSON: {extracted_json}")
-                # Return a default structure if parsing fails
-                return {"improvement_areas": ["Failed to parse improvement areas"]}
-        else:
-            print("No JSON object found in response")
-            # Return a default structure if no JSON found
-            return {"improvement_areas": ["Failed to extract improvement areas"]}
+        result = generate_text(prompt, parse=parse_json_response)
+    except ValueError as e:
+        print(f"Improvement areas JSON parsing failed: {str(e)}")
+        # Return a default structure if parsing fails
+        return {"improvement_areas": ["Failed to parse improvement areas"]}
+    
+    # Ensure we only return 2-3 improvements
+    result['improvement_areas'] = result.get('improvement_areas', [])[:3]
+    return result
 
-def calculate_spillover_points(sprint_data, spilled_stories):
+def calculate_spillover_points(sprint_data, spilled_stories, numbers=None):
     """Calculate story points for stories that spilled over from the sprint."""
-    # Get sprint dates
-    sprint_start = parse_jira_datetime(sprint_data['start_date'])
-    sprint_end = parse_jira_datetime(sprint_data['end_date'])
-    
-    # Ensure both sprint dates are timezone-aware
-    utc = pytz.UTC
-    if sprint_start and sprint_start.tzinfo is None:
-        sprint_start = utc.localize(sprint_start)
-    if sprint_end and sprint_end.tzinfo is None:
-        sprint_end = utc.localize(sprint_end)
+    story_flags = (numbers or calculate_sprint_numbers(sprint_data))['stories']
     
     total_spilled_points = 0
     spilled_stories_with_points = []
     
     for story in spilled_stories:
         story_id = story['story_id']
-        # Find the corresponding story in sprint_data
-        original_story = next((s for s in sprint_data['stories'] if s['key'] == story_id), None)
-        if not original_story:
-            continue
-            
-        # Check if story was in sprint at start
-        was_in_sprint_at_start = False
-        for change in original_story['changelog']:
-            change_date = parse_jira_datetime(change['date'])
-            if not change_date:
-                continue
-                
-            # Ensure change_date is timezone-aware
-            if change_date.tzinfo is None:
-                change_date = utc.localize(change_date)
-            
-            if change['field'] == 'Sprint' and change_date <= sprint_start:
-                was_in_sprint_at_start = True
-                break
-        
-        # If no sprint changes found, check creation date
-        if not was_in_sprint_at_start and not any(change['field'] == 'Sprint' for change in original_story['changelog']):
-            story_created = parse_jira_datetime(original_story['created'])
-            if story_created:
-                if story_created.tzinfo is None:
-                    story_created = utc.localize(story_created)
-                if story_created <= sprint_start:
-                    was_in_sprint_at_start = True
+        flags = story_flags.get(story_id)
         
         # Only count points if story was in sprint at start
-        if was_in_sprint_at_start:
-            story_points = original_story.get('story_points', 0) or 0  # Convert None to 0
-            total_spilled_points += story_points
+        if flags and flags['in_sprint_at_start']:
+            total_spilled_points += flags['story_points']
             spilled_stories_with_points.append({
                 'story_id': story_id,
-                'story_points': story_points,
+                'story_points': flags['story_points'],
                 'reason': story['reason']
             })
     
     return total_spilled_points, spilled_stories_with_points
 
-def generate_improvement_areas(structured_data, sprint_data):
-    """Generate improvement areas using LLM based on structured data and sprint data."""
-    # First analyze churned stories
-    churn_analysis = analyze_churned_stories(sprint_data)
+# Upper bound for the size of the improvement areas prompt
+IMPROVEMENT_PROMPT_TOKEN_BUDGET = int(os.getenv('IMPROVEMENT_PROMPT_TOKEN_BUDGET', '30000'))
+# Ask Gemini for exact token counts instead of estimating them locally
+GEMINI_COUNT_TOKENS = os.getenv('GEMINI_COUNT_TOKENS', 'false').lower() == 'true'
+
+# Changelog fields the improvement analysis looks at, and their compact names
+PROMPT_CHANGE_FIELDS = {
+    'Sprint': 'sprint_changes',
+    'status': 'status_changes',
+    'assignee': 'assignee_changes',
+    'Story Points': 'point_changes'
+}
+
+def estimate_tokens(text):
+    """Roughly estimate the number of tokens in a text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+def count_prompt_tokens(prompt):
+    """Count the tokens of a prompt, locally unless GEMINI_COUNT_TOKENS is enabled."""
+    if GEMINI_COUNT_TOKENS:
+        try:
+            return model.count_tokens(prompt).total_tokens
+        except Exception as e:
+            print(f"Token counting failed, falling back to estimate: {str(e)}")
+    return estimate_tokens(prompt)
+
+def compact_story_for_prompt(story, max_changes=None):
+    """Reduce a story to the fields and changelog entries the improvement analysis needs."""
+    compact = {
+        'key': story['key'],
+        'type': story['type'],
+        'status': story['status'],
+        'points': story['story_points'],
+        'assignee': story['assignee'],
+        'created': story['created']
+    }
+    for change in story['changelog']:
+        name = PROMPT_CHANGE_FIELDS.get(change['field'])
+        if name:
+            compact.setdefault(name, []).append([change['date'], change['from'], change['to']])
+    if max_changes is not None:
+        for name in PROMPT_CHANGE_FIELDS.values():
+            if name in compact:
+                compact[name] = compact[name][-max_changes:]
+    if story['blockers']:
+        compact['blockers'] = len(story['blockers'])
+    return compact
+
+def compact_sprint_data_for_prompt(sprint_data, max_changes=None, max_stories=None):
+    """Build the compact sprint payload for the improvement prompt.
+
+    With max_stories set, stories that moved between sprints or are not done are kept first.
+    """
+    stories = sprint_data['stories']
+    if max_stories is not None and len(stories) > max_stories:
+        stories = sorted(stories, key=lambda story: (
+            not any(change['field'] == 'Sprint' for change in story['changelog']),
+            story['status'] == 'Done'
+        ))
+    compact = {
+        'sprint_name': sprint_data['sprint_name'],
+        'start_date': sprint_data['start_date'],
+        'end_date': sprint_data['end_date'],
+        'stories': [compact_story_for_prompt(story, max_changes) for story in stories[:max_stories]]
+    }
+    if max_stories is not None and len(stories) > max_stories:
+        compact['omitted_stories'] = len(stories) - max_stories
+    return compact
+
+def summarize_numbers_for_prompt(numbers, max_items=None):
+    """Pick the computed sprint numbers the narrative prompt needs.
+
+    With max_items set, the spilled and churned story lists keep the largest stories and
+    the utilization list the members furthest from full utilization; totals stay exact.
+    """
+    churned = {}
+    for story in numbers['churn']['churned_stories']:
+        entry = churned.setdefault(story['story_id'], {
+            'story_id': story['story_id'],
+            'type': story['type'],
+            'story_points': story['story_points'] or 0,
+            'churn_count': 0
+        })
+        entry['churn_count'] += 1
+    
+    summary = {
+        'capacity': numbers['capacity'],
+        'committed': numbers['committed'],
+        'completed': numbers['completed'],
+        'spilled_stories': [
+            {key: story[key] for key in ('story_id', 'story_points', 'status_at_end', 'reason')}
+            for story in numbers['spillover']['spilled_stories']
+        ],
+        'total_spilled_points': numbers['spillover']['total_spilled_points'],
+        'churned_stories': list(churned.values()),
+        'total_churned_points': numbers['churn']['total_churned_points'],
+        'utilization': numbers['utilization']
+    }
+    if max_items is None:
+        return summary
     
-    prompt = f"""
-    Analyze the following sprint data and generate detailed improvement areas. Focus on:
+    priorities = {
+        'spilled_stories': lambda story: -(story['story_points'] or 0),
+        'churned_stories': lambda story: (-story['churn_count'], -story['story_points']),
+        'utilization': lambda member: -abs(member['utilization'] - 100) if member['utilization'] is not None else 0
+    }
+    for key, priority in priorities.items():
+        items = summary[key]
+        if len(items) > max_items:
+            summary[key] = sorted(items, key=priority)[:max_items]
+            summary[f'omitted_{key}'] = len(items) - max_items
+    return summary
+
+def build_improvement_prompt(numbers, sprint_data, max_changes=None, max_stories=None):
+    """Assemble the narrative prompt around the computed numbers and the relevant stories."""
+    # Only spilled and churned stories need their history for the narrative
+    focus_keys = {story['story_id'] for story in numbers['spillover']['spilled_stories']}
+    focus_keys.update(story['story_id'] for story in numbers['churn']['churned_stories'])
+    focus_data = compact_sprint_data_for_prompt(
+        dict(sprint_data, stories=[story for story in sprint_data['stories'] if story['key'] in focus_keys]),
+        max_changes, max_stories
+    )
+    
+    return f"""
+    You are reviewing a finished sprint. The numbers below were computed exactly from Jira and the team capacity sheet.
+    Do not recompute or change any number; write the analysis around them. Focus on:
     1. Spill-over Analysis
-       - Identify stories that spilled over
-       - Identify stories from changelog if their sprint number has changed from current sprint to future sprints or removed from current sprint during the sprint.
+       - Explain why each spilled story spilled over
        - Analyze root causes
        - Suggest preventive measures
     
     2. Churn Analysis
-       - Analyze the following churned stories that were added to the sprint after it started:
-       {json.dumps(churn_analysis, indent=2)}
-       - Identify all churned stories that were added to the sprint after it started.
-       - Analyze impact on sprint velocity considering both story count and story points
+       - Analyze the impact of the churned stories on sprint velocity considering both story count and story points
        - Suggest ways to reduce churn based on the type and size of churned stories
     
     3. Team Utilization
-       For each team member:
-       a) Calculate completed story points:
-          - Look at each story assigned to the member
-          - Check the story's changelog for status changes
-          - Only count story points if:
-            * The story was marked as "Done" during the sprint period
-            * The status change to "Done" occurred between sprint start and end dates
-            * The story was assigned to the member at the time of completion
-          - Do not count story points if:
-            * The story was completed before sprint start
-            * The story was completed after sprint end
-            * The story was completed by a different assignee
-            * The story was not assigned to anyone
-       
-       b) Calculate utilization:
-          - Get the member's capacity from team_members data
-          - Calculate utilization as: (completed story points / capacity) * 100
-          - Consider over-utilized if utilization > 100%
-          - Consider under-utilized if utilization < 70%
-       
-       c) Analyze workload distribution:
-          - Compare utilization across team members
-          - Identify any significant imbalances
-          - Consider story point distribution
-          - Look for patterns in story assignments
+       - Members above {OVER_UTILIZATION_PERCENT}% utilization are over-utilized, members below {UNDER_UTILIZATION_PERCENT}% are under-utilized
+       - Compare utilization across team members and identify significant imbalances
+       - Suggest how to balance the workload
     
     4. Additional Improvement Areas
        - Identify any other patterns or issues
        - Suggest specific actionable improvements
     
-    Sprint Data:
-    {json.dumps(sprint_data, indent=2)}
+    Sprint Numbers:
+    {json.dumps(summarize_numbers_for_prompt(numbers, max_stories), separators=(',', ':'))}
     
-    Excel Data:
-    {json.dumps(structured_data, indent=2)}
+    Spilled and Churned Stories (each story lists its sprint, status, assignee and story point changes as [date, from, to]):
+    {json.dumps(focus_data, separators=(',', ':'))}
     
     Return the analysis in this JSON format:
     {{
-        "spill_over_analysis": {{
-            "spilled_stories": [
-                {{
-                    "story_id": string,
-                    "reason": string,
-                    "prevention_suggestion": string
-                }}
-            ],
-            "root_causes": [string],
-            "recommendations": [string]
-        }},
-        "churn_analysis": {{
-            "high_churn_stories": [
-                {{
-                    "story_id": string,
-                    "churn_count": number,
-                    "story_points": number,
-                    "impact": string
-                }}
-            ],
-            "velocity_impact": string,
-            "reduction_suggestions": [string]
-        }},
-        "team_utilization": {{
-            "under_utilized": [
-                {{
-                    "member": string,
-                    "capacity": number,
-                    "completed_points": number,
-                    "utilization": number,
-                    "suggestion": string
-                }}
-            ],
-            "over_utilized": [
-                {{
-                    "member": string,
-                    "capacity": number,
-                    "completed_points": number,
-                    "utilization": number,
-                    "suggestion": string
-                }}
-            ],
-            "workload_distribution": string,
-            "optimization_suggestions": [string]
-        }},
+        "spilled_story_notes": [
+            {{
+                "story_id": string,
+                "reason": string,
+                "prevention_suggestion": string
+            }}
+        ],
+        "root_causes": [string],
+        "recommendations": [string],
+        "churn_story_impacts": [
+            {{
+                "story_id": string,
+                "impact": string
+            }}
+        ],
+        "velocity_impact": string,
+        "reduction_suggestions": [string],
+        "member_suggestions": [
+            {{
+                "member": string,
+                "suggestion": string
+            }}
+        ],
+        "workload_distribution": string,
+        "optimization_suggestions": [string],
         "additional_improvements": [
             {{
                 "area": string,
@@ -1015,282 +2772,291 @@ def generate_improvement_areas(structured_data, sprint_data):
     }}
     
     Important: 
-    - For team utilization, only count story points for stories completed during the sprint by the assigned member
-    - Check changelog entries to verify completion dates and assignees
+    - Use the story ids and member names exactly as given
     - Return ONLY the JSON object, with no additional text or explanation
     """
+
+def fit_improvement_prompt(numbers, sprint_data, budget=None):
+    """Build the improvement prompt, compacting it further until it fits the token budget.
+
+    Returns None when even the smallest prompt, with totals only, is over the budget.
+    """
+    budget = IMPROVEMENT_PROMPT_TOKEN_BUDGET if budget is None else budget
+    
+    # Trim changelog history first, then drop the least interesting stories and list entries
+    attempts = [(None, None), (3, None), (1, None)]
+    max_stories = max(len(sprint_data['stories']), len(numbers['utilization']))
+    while max_stories > 1:
+        max_stories //= 2
+        attempts.append((1, max_stories))
+    attempts.append((1, 0))
+    
+    for max_changes, stories in attempts:
+        prompt = build_improvement_prompt(numbers, sprint_data, max_changes, stories)
+        tokens = count_prompt_tokens(prompt)
+        if tokens <= budget:
+            print(f"Improvement prompt uses {tokens} tokens (budget {budget})")
+            return prompt
+    
+    print(f"Improvement prompt still uses {tokens} tokens after compaction (budget {budget}), skipping it")
+    return None
+
+def merge_improvement_areas(numbers, narrative):
+    """Combine the computed numbers with the LLM narrative into the improvement areas structure."""
+    spill_notes = {note.get('story_id'): note for note in narrative.get('spilled_story_notes', [])}
+    churn_impacts = {note.get('story_id'): note.get('impact', '') for note in narrative.get('churn_story_impacts', [])}
+    member_suggestions = {note.get('member'): note.get('suggestion', '') for note in narrative.get('member_suggestions', [])}
+    
+    high_churn_stories = []
+    for story in summarize_numbers_for_prompt(numbers)['churned_stories']:
+        high_churn_stories.append({
+            'story_id': story['story_id'],
+            'churn_count': story['churn_count'],
+            'story_points': story['story_points'],
+            'impact': churn_impacts.get(story['story_id'], '')
+        })
     
-    response = model.generate_content(prompt)
-    
-    # Clean the response text to ensure it's valid JSON
-    response_text = response.text.strip()
+    def utilization_entry(member):
+        return {
+            'member': member['member'],
+            'capacity': member['capacity'],
+            'completed_points': member['completed'],
+            'utilization': member['utilization'],
+            'suggestion': member_suggestions.get(member['member'], '')
+        }
     
-    # Remove any markdown code block indicators if present
-    if response_text.startswith('```json'):
-        response_text = response_text[7:]
-    if response_text.startswith('```'):
-        response_text = response_text[3:]
-    if response_text.endswith('```'):
-        response_text = response_text[:-3]
-        
-    response_text = response_text.strip()
+    measured = [member for member in numbers['utilization'] if member['utilization'] is not None]
     
-    try:
-        return json.loads(response_text)
-    except json.JSONDecodeError as e:
-        # If JSON parsing fails, try to extract JSON from the response
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except json.JSONDecodeError:
-                raise Exception(f"Failed to parse JSON from response: {str(e)}")
-        else:
-            raise Exception(f"Failed to extract JSON from response: {str(e)}")
+    return {
+        'spill_over_analysis': {
+            'spilled_stories': [
+                {
+                    'story_id': story['story_id'],
+                    'story_points': story['story_points'],
+                    'reason': spill_notes.get(story['story_id'], {}).get('reason') or story['reason'],
+                    'prevention_suggestion': spill_notes.get(story['story_id'], {}).get('prevention_suggestion', '')
+                }
+                for story in numbers['spillover']['spilled_stories']
+            ],
+            'root_causes': narrative.get('root_causes', []),
+            'recommendations': narrative.get('recommendations', [])
+        },
+        'churn_analysis': {
+            'high_churn_stories': high_churn_stories,
+            'velocity_impact': narrative.get('velocity_impact', ''),
+            'reduction_suggestions': narrative.get('reduction_suggestions', [])
+        },
+        'team_utilization': {
+            'under_utilized': [utilization_entry(m) for m in measured if m['utilization'] < UNDER_UTILIZATION_PERCENT],
+            'over_utilized': [utilization_entry(m) for m in measured if m['utilization'] > OVER_UTILIZATION_PERCENT],
+            'workload_distribution': narrative.get('workload_distribution', ''),
+            'optimization_suggestions': narrative.get('optimization_suggestions', [])
+        },
+        'additional_improvements': narrative.get('additional_improvements', [])
+    }
+
+def generate_improvement_areas(structured_data, sprint_data, numbers=None):
+    """Generate improvement areas from locally computed sprint numbers and an LLM narrative."""
+    # Compute all numbers locally first, unless the caller already has them
+    numbers = numbers or calculate_sprint_numbers(sprint_data, structured_data)
+    
+    prompt = fit_improvement_prompt(numbers, sprint_data)
+    # Without a prompt that fits, the report keeps the computed numbers without narrative
+    narrative = generate_text(prompt, parse=parse_json_response) if prompt else {}
+    return merge_improvement_areas(numbers, narrative)
 
 def calculate_sprint_metrics(sprint_data):
     """Calculate sprint metrics including unassigned stories."""
-    # Get sprint dates
-    sprint_start = parse_jira_datetime(sprint_data['start_date'])
-    sprint_end = parse_jira_datetime(sprint_data['end_date'])
-    
-    # Ensure both sprint dates are timezone-aware
-    utc = pytz.UTC
-    if sprint_start and sprint_start.tzinfo is None:
-        sprint_start = utc.localize(sprint_start)
-    if sprint_end and sprint_end.tzinfo is None:
-        sprint_end = utc.localize(sprint_end)
-    
-    # Initialize metrics
-    metrics = {
-        'committed': 0,
-        'completed': 0
+    numbers = calculate_sprint_numbers(sprint_data)
+    return {
+        'committed': numbers['committed'],
+        'completed': numbers['completed']
     }
-    
-    for story in sprint_data['stories']:
-        story_points = story['story_points'] or 0
-        
-        # Track story status
-        was_in_sprint_at_start = False
-        was_completed_during_sprint = False
-        
-        # Check changelog to determine story status
-        for change in story['changelog']:
-            change_date = parse_jira_datetime(change['date'])
-            if not change_date:
-                continue
-                
-            # Ensure change_date is timezone-aware
-            if change_date.tzinfo is None:
-                change_date = utc.localize(change_date)
-            
-            # Check if story was in sprint at start
-            if change['field'] == 'Sprint':
-                if change_date <= sprint_start:
-                    was_in_sprint_at_start = True
-            
-            # Check if story was completed during sprint
-            if change['field'] == 'status' and change['to'] == 'Done':
-                if sprint_start <= change_date <= sprint_end:
-                    was_completed_during_sprint = True
-        
-        # If no sprint changes found, check creation date
-        if not any(change['field'] == 'Sprint' for change in story['changelog']):
-            story_created = parse_jira_datetime(story['created'])
-            if story_created:
-                if story_created.tzinfo is None:
-                    story_created = utc.localize(story_created)
-                if story_created <= sprint_start:
-                    was_in_sprint_at_start = True
-        
-        # Add to committed points if story was in sprint at start
-        if was_in_sprint_at_start:
-            metrics['committed'] += story_points
-        
-        # Add to completed points if story was completed during sprint
-        if was_completed_during_sprint:
-            metrics['completed'] += story_points
-    
-    return metrics
 
 def calculate_member_story_points(sprint_data):
     """Calculate committed and completed story points for each team member."""
-    # Initialize member data
-    member_data = {}
-    
-    # Get sprint dates
-    sprint_start = parse_jira_datetime(sprint_data['start_date'])
-    sprint_end = parse_jira_datetime(sprint_data['end_date'])
-    
-    # Ensure both sprint dates are timezone-aware
-    utc = pytz.UTC
-    if sprint_start and sprint_start.tzinfo is None:
-        sprint_start = utc.localize(sprint_start)
-    if sprint_end and sprint_end.tzinfo is None:
-        sprint_end = utc.localize(sprint_end)
-    
-    for story in sprint_data['stories']:
-        assignee = story['assignee']
-        if not assignee:
-            continue
-            
-        # Initialize member data if not exists
-        if assignee not in member_data:
-            member_data[assignee] = {
-                'committed': 0,
-                'completed': 0
-            }
-            
-        story_points = story['story_points'] or 0
-        
-        # Track story status
-        was_in_sprint_at_start = False
-        was_completed_during_sprint = False
-        
-        # Check changelog to determine story status
-        for change in story['changelog']:
-            change_date = parse_jira_datetime(change['date'])
-            if not change_date:
-                continue
-                
-            # Ensure change_date is timezone-aware
-            if change_date.tzinfo is None:
-                change_date = utc.localize(change_date)
-            
-            # Check if story was in sprint at start
-            if change['field'] == 'Sprint':
-                if change_date <= sprint_start:
-                    was_in_sprint_at_start = True
-            
-            # Check if story was completed during sprint
-            if change['field'] == 'status' and change['to'] == 'Done':
-                if sprint_start <= change_date <= sprint_end:
-                    was_completed_during_sprint = True
-        
-        # If no sprint changes found, check creation date
-        if not any(change['field'] == 'Sprint' for change in story['changelog']):
-            story_created = parse_jira_datetime(story['created'])
-            if story_created:
-                if story_created.tzinfo is None:
-                    story_created = utc.localize(story_created)
-                if story_created <= sprint_start:
-                    was_in_sprint_at_start = True
-        
-        # Add to committed points if story was in sprint at start
-        if was_in_sprint_at_start:
-            member_data[assignee]['committed'] += story_points
-        
-        # Add to completed points if story was completed during sprint
-        if was_completed_during_sprint:
-            member_data[assignee]['completed'] += story_points
-    
-    return member_data
+    return calculate_sprint_numbers(sprint_data)['members']
 
-def generate_member_capacity_table(structured_data, sprint_data):
-    """Generate a table showing member-wise capacity and utilization using LLM."""
-    try:
-        print("Starting member capacity table generation...")
-        
-        # Calculate story points for each member
-        member_points = calculate_member_story_points(sprint_data)
-        
-        # Prepare team capacity data
-        team_capacity = "\n".join([
-            f"Team Member: {member['name']}, Capacity: {member['capacity']} points"
-            for member in structured_data['team_members']
-        ])
-        
-        # Prepare member points data
-        member_points_text = "\n".join([
-            f"Member: {member}, Committed Points: {data['committed']}, Completed Points: {data['completed']}"
-            for member, data in member_points.items()
-        ])
+def build_sprint_frames(sprints):
+    """Flatten sprints into columnar sprint, story and changelog-event DataFrames.
 
-        # Create prompt for LLM
-        prompt = f"""
-        Generate a member-wise capacity table using the following data.
-        Consider the sprint period from {sprint_data['start_date']} to {sprint_data['end_date']}.
-
-        Team Capacity:
-        {team_capacity}
-
-        Calculated Story Points:
-        {member_points_text}
-
-        For each team member, calculate:
-        1. Use the provided committed and completed points
-        2. Calculate utilization: (Completed points / Capacity) * 100
-
-        Return the data in this JSON format:
-        {{
-            "members": [
-                {{
-                    "assignee": "string",
-                    "capacity": number,
-                    "committed": number,
-                    "completed": number,
-                    "utilization": "string (percentage with % symbol)"
-                }}
-            ]
-        }}
-
-        Important:
-        - Use the exact committed and completed points provided
-        - Calculate utilization based on the provided capacity
-        - Return ONLY the JSON object, with no additional text or explanation
-        """
+    Each sprint_data dict gets an ordinal in the 'sprint' column; stories get a
+    'story' ordinal that the events reference. Dates are parsed once into
+    datetime64 UTC columns and repeated names are stored as categoricals.
+    """
+    sprint_rows = []
+    story_columns = {name: [] for name in ('sprint', 'key', 'summary', 'type', 'status', 'assignee', 'story_points', 'created')}
+    event_columns = {name: [] for name in ('story', 'date', 'field', 'from', 'to')}
+    
+    for sprint_position, sprint_data in enumerate(sprints):
+        sprint_rows.append({
+            'name': sprint_data.get('sprint_name'),
+            'start': sprint_data.get('start_date'),
+            'end': sprint_data.get('end_date')
+        })
+        for story in sprint_data['stories']:
+            story_position = len(story_columns['key'])
+            story_columns['sprint'].append(sprint_position)
+            story_columns['key'].append(story['key'])
+            story_columns['summary'].append(story['summary'])
+            story_columns['type'].append(story['type'])
+            story_columns['status'].append(story['status'])
+            story_columns['assignee'].append(story['assignee'])
+            story_columns['story_points'].append(story['story_points'])
+            story_columns['created'].append(story['created'])
+            for change in story['changelog']:
+                event_columns['story'].append(story_position)
+                event_columns['date'].append(change['date'])
+                event_columns['field'].append(change['field'])
+                event_columns['from'].append(change['from'])
+                event_columns['to'].append(change['to'])
+    
+    def to_datetimes(values):
+        return pd.to_datetime(pd.Series(values, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    
+    sprints_df = pd.DataFrame(sprint_rows, columns=['name', 'start', 'end'])
+    sprints_df['start'] = to_datetimes(sprints_df['start'])
+    sprints_df['end'] = to_datetimes(sprints_df['end'])
+    
+    stories_df = pd.DataFrame(story_columns)
+    stories_df['sprint'] = stories_df['sprint'].astype(np.int64)
+    stories_df['type'] = stories_df['type'].astype('category')
+    stories_df['status'] = stories_df['status'].astype('category')
+    stories_df['assignee'] = stories_df['assignee'].astype('category')
+    stories_df['story_points'] = pd.to_numeric(stories_df['story_points'], errors='coerce').fillna(0)
+    stories_df['created'] = to_datetimes(story_columns['created'])
+    
+    events_df = pd.DataFrame(event_columns)
+    events_df['story'] = events_df['story'].astype(np.int64)
+    events_df['date'] = to_datetimes(event_columns['date'])
+    events_df['field'] = events_df['field'].astype('category')
+    
+    return {'sprints': sprints_df, 'stories': stories_df, 'events': events_df}
 
-        print("Sending prompt to LLM...")
-        # Get response from LLM
-        response = model.generate_content(prompt)
-        print("Received response from LLM")
-        
-        # Clean the response text to ensure it's valid JSON
-        response_text = response.text.strip()
-        print(f"Raw LLM response: {response_text[:200]}...")  # Print first 200 chars
-        
-        # Remove any markdown code block indicators if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-            
-        response_text = response_text.strip()
-        print(f"Cleaned response text: {response_text[:200]}...")  # Print first 200 chars
-        
-        try:
-            # Parse the JSON response
-            result = json.loads(response_text)
-            print("Successfully parsed JSON response")
-            return result['members']
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)}")
-            # If JSON parsing fails, try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    result = json.loads(json_match.group())
-                    print("Successfully extracted and parsed JSON from response")
-                    return result['members']
-                except json.JSONDecodeError as e2:
-                    print(f"Failed to parse extracted JSON: {str(e2)}")
-                    raise Exception(f"Failed to parse JSON from LLM response: {str(e2)}")
-            else:
-                print("No JSON object found in response")
-                raise Exception(f"Failed to extract JSON from LLM response: {str(e)}")
+def calculate_story_flags(frames):
+    """Vectorized per-story sprint flags over all sprints in the frames.
+
+    Mirrors calculate_sprint_numbers: adds in_sprint_at_start, completed_during_sprint,
+    status_at_end, churn_count, removed_from_sprint and spilled columns to a copy of
+    the stories frame.
+    """
+    sprints, stories, events = frames['sprints'], frames['stories'], frames['events']
+    story_count = len(stories)
+    if sprints[['start', 'end']].isna().any(axis=None):
+        raise Exception("Invalid sprint dates")
     
-    except Exception as e:
-        import traceback
-        print(f"Error in generate_member_capacity_table: {str(e)}")
-        print("Full traceback:")
-        print(traceback.format_exc())
-        raise
+    def utc_values(dates):
+        # Naive datetime64 values in UTC compare as plain integers instead of Timestamp objects
+        return dates.dt.tz_localize(None).to_numpy()
+    
+    event_story = events['story'].to_numpy()
+    event_sprint = stories['sprint'].to_numpy()[event_story]
+    event_date = utc_values(events['date'])
+    sprint_start = utc_values(sprints['start'])
+    sprint_end = utc_values(sprints['end'])
+    start = sprint_start[event_sprint]
+    end = sprint_end[event_sprint]
+    
+    # Comparisons against NaT are False, so undated entries only count towards has_sprint_changes
+    is_sprint = (events['field'] == 'Sprint').to_numpy()
+    is_status = (events['field'] == 'status').to_numpy()
+    in_window = (event_date >= start) & (event_date <= end)
+    before_end = event_date <= end
+    after_end = event_date > end
+    
+    def any_per_story(mask):
+        return np.bincount(event_story[mask], minlength=story_count) > 0
+    
+    has_sprint_changes = any_per_story(is_sprint)
+    created_before_start = utc_values(stories['created']) <= sprint_start[stories['sprint'].to_numpy()]
+    in_sprint_at_start = any_per_story(is_sprint & (event_date <= start)) | (~has_sprint_changes & created_before_start)
+    completed = any_per_story(is_status & in_window & (events['to'] == 'Done').to_numpy())
+    churn_mask = is_sprint & in_window
+    churn_count = np.bincount(event_story[churn_mask], minlength=story_count)
+    
+    # Status at sprint end: the latest status change up to the end, else the status
+    # the story left at its earliest change after the end, else its current status
+    status_at_end = stories['status'].astype(object).to_numpy().copy()
+    status_events = events.assign(order=np.arange(len(events)))
+    after = status_events[is_status & after_end].sort_values(['story', 'date', 'order']).drop_duplicates('story', keep='first')
+    status_at_end[after['story'].to_numpy()] = after['from'].to_numpy()
+    before = status_events[is_status & before_end].sort_values(['story', 'date', 'order']).drop_duplicates('story', keep='last')
+    status_at_end[before['story'].to_numpy()] = before['to'].to_numpy()
+    
+    # Stories moved out of their sprint during it; the last such change gives the reason
+    removed = events[churn_mask]
+    sprint_names = sprints['name'].to_numpy()[event_sprint[churn_mask]]
+    moved_out = np.array([
+        bool(name) and isinstance(moved_from, str) and name in moved_from
+        and not (isinstance(moved_to, str) and name in moved_to)
+        for name, moved_from, moved_to in zip(sprint_names, removed['from'], removed['to'])
+    ], dtype=bool)
+    removed = removed[moved_out].drop_duplicates('story', keep='last')
+    removed_from_sprint = np.zeros(story_count, dtype=bool)
+    removed_from_sprint[removed['story'].to_numpy()] = True
+    
+    flags = stories.copy()
+    flags['in_sprint_at_start'] = in_sprint_at_start
+    flags['completed_during_sprint'] = completed
+    flags['status_at_end'] = status_at_end
+    flags['churn_count'] = churn_count
+    flags['removed_from_sprint'] = removed_from_sprint
+    flags['spilled'] = removed_from_sprint | ((status_at_end != 'Done') & ~completed)
+    return flags
+
+def calculate_sprint_frame_metrics(frames):
+    """Vectorized committed, completed, churn, spillover and per-member points for every sprint in the frames.
+
+    Returns a dict of DataFrames: 'sprints' (one row per sprint), 'members' (one row
+    per sprint and assignee) and 'stories' (the per-story flags).
+    """
+    flags = calculate_story_flags(frames)
+    points = flags['story_points']
+    flags['committed_points'] = points.where(flags['in_sprint_at_start'], 0)
+    flags['completed_points'] = points.where(flags['completed_during_sprint'], 0)
+    flags['churned_points'] = points * flags['churn_count']
+    flags['spilled_points'] = points.where(flags['spilled'] & flags['in_sprint_at_start'], 0)
+    
+    per_sprint = flags.groupby('sprint').agg(
+        committed=('committed_points', 'sum'),
+        completed=('completed_points', 'sum'),
+        churned=('churn_count', 'sum'),
+        churned_points=('churned_points', 'sum'),
+        spilled=('spilled', 'sum'),
+        spilled_points=('spilled_points', 'sum')
+    )
+    sprints = frames['sprints'].join(per_sprint)
+    count_columns = ['churned', 'spilled']
+    point_columns = ['committed', 'completed', 'churned_points', 'spilled_points']
+    sprints[count_columns] = sprints[count_columns].fillna(0).astype(np.int64)
+    sprints[point_columns] = sprints[point_columns].fillna(0)
+    
+    members = (
+        flags[flags['assignee'].notna()]
+        .groupby(['sprint', 'assignee'], observed=True)[['committed_points', 'completed_points']]
+        .sum()
+        .rename(columns={'committed_points': 'committed', 'completed_points': 'completed'})
+        .reset_index()
+    )
+    return {'sprints': sprints, 'members': members, 'stories': flags}
 
-def generate_combined_sprint_doc(sprint_data, improvement_areas, subgoals, story_assignments, achievements, structured_data):
+def generate_member_capacity_table(structured_data, sprint_data, numbers=None):
+    """Generate a table showing member-wise capacity and utilization from the computed sprint numbers."""
+    print("Starting member capacity table generation...")
+    numbers = numbers or calculate_sprint_numbers(sprint_data, structured_data)
+    
+    return [
+        {
+            'assignee': member['member'],
+            'capacity': member['capacity'],
+            'committed': member['committed'],
+            'completed': member['completed'],
+            'utilization': f"{member['utilization']:g}%" if member['utilization'] is not None else 'N/A'
+        }
+        for member in numbers['utilization']
+    ]
+
+def generate_combined_sprint_doc(sprint_data, improvement_areas, subgoals, story_assignments, achievements, structured_data, numbers=None):
     """Generate a Word document containing both sprint report and analysis."""
     doc = Document()
     
@@ -1308,23 +3074,23 @@ def generate_combined_sprint_doc(sprint_data, improvement_areas, subgoals, story
     doc.add_heading('Sprint Summary', level=1)
     
     # Calculate sprint metrics
+    numbers = numbers or calculate_sprint_numbers(sprint_data, structured_data)
+    
     # Sprint Capacity
-    total_capacity = sum(member.get('capacity', 0) or 0 for member in structured_data['team_members'])
+    total_capacity = numbers['capacity']
     
     # Calculate total committed and completed points (including unassigned)
-    sprint_metrics = calculate_sprint_metrics(sprint_data)
-    total_committed = sprint_metrics['committed']
-    total_completed = sprint_metrics['completed']
+    total_committed = numbers['committed']
+    total_completed = numbers['completed']
     
-    # Churn
-    churned_stories = improvement_areas['churn_analysis']['high_churn_stories']
-    total_churned = len(churned_stories)
-    total_churned_points = sum(story.get('story_points', 0) or 0 for story in churned_stories)
+    # Churn, counted per addition to the sprint like the trends endpoint
+    total_churned = numbers['churn']['total_churned']
+    total_churned_points = numbers['churn']['total_churned_points']
     
     # Spillover
     spilled_stories = improvement_areas['spill_over_analysis']['spilled_stories']
     total_spilled = len(spilled_stories)
-    total_spilled_points, spilled_stories_with_points = calculate_spillover_points(sprint_data, spilled_stories)
+    total_spilled_points, spilled_stories_with_points = calculate_spillover_points(sprint_data, spilled_stories, numbers)
     
     # Add metrics table
     table = doc.add_table(rows=1, cols=2)
@@ -1351,7 +3117,7 @@ def generate_combined_sprint_doc(sprint_data, improvement_areas, subgoals, story
     
     # Add Member Capacity Table
     doc.add_heading('Team Member Capacity Analysis', level=1)
-    member_data = generate_member_capacity_table(structured_data, sprint_data)
+    member_data = generate_member_capacity_table(structured_data, sprint_data, numbers)
     
     # Create member capacity table
     member_table = doc.add_table(rows=1, cols=5)
@@ -1525,83 +3291,172 @@ def generate_combined_sprint_doc(sprint_data, improvement_areas, subgoals, story
     
     return doc
 
-@app.route('/api/sprint-combined-report', methods=['POST'])
-def generate_combined_report():
-    try:
-        print("Starting combined report generation...")
-        
-        if 'file' not in request.files:
-            print("No file in request")
-            return jsonify({'error': 'No file provided'}), 400
-        
-        board_id = request.form.get('boardId')
-        sprint_id = request.form.get('sprintId')
-        
-        print(f"Received board_id: {board_id}, sprint_id: {sprint_id}")
-        
-        if not board_id or not sprint_id:
-            print("Missing board_id or sprint_id")
-            return jsonify({'error': 'Board ID and Sprint ID are required'}), 400
-        
-        excel_file = request.files['file']
-        if not excel_file.filename.endswith(('.xlsx', '.xls')):
-            print(f"Invalid file format: {excel_file.filename}")
-            return jsonify({'error': 'Invalid file format. Please upload an Excel file.'}), 400
-        
-        print("Getting Jira client...")
-        # Get sprint details
-        jira_client = get_jira_client()
-        sprint = jira_client.sprint(sprint_id)
-        if not sprint:
-            print(f"Sprint not found: {sprint_id}")
-            return jsonify({'error': 'Sprint not found'}), 404
-        
-        print("Getting sprint stories...")
+# Number of report pipeline stages allowed to run at the same time
+REPORT_STAGE_WORKERS = int(os.getenv('REPORT_STAGE_WORKERS', '4'))
+
+def run_stage_graph(stages, workers=None, on_progress=None):
+    """Run a dependency graph of report stages, each one as soon as its inputs are ready.
+
+    `stages` maps a stage name to a (dependencies, func) pair; func receives the results
+    of the finished stages and returns its own result. Returns all stage results.
+    """
+    for name, (dependencies, _) in stages.items():
+        unknown = [dep for dep in dependencies if dep not in stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(unknown)}")
+    
+    workers = REPORT_STAGE_WORKERS if workers is None else workers
+    pending = dict(stages)
+    running = {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        while pending or running:
+            for name, (dependencies, func) in list(pending.items()):
+                if all(dep in results for dep in dependencies):
+                    del pending[name]
+                    print(f"Starting stage {name}...")
+                    if on_progress:
+                        on_progress(name, 'running')
+                    running[executor.submit(func, dict(results))] = name
+            
+            if not running:
+                raise ValueError(f"Stages have circular dependencies: {', '.join(pending)}")
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    if on_progress:
+                        on_progress(name, 'failed')
+                    raise
+                print(f"Finished stage {name}")
+                if on_progress:
+                    on_progress(name, 'done')
+    return results
+
+# Human readable names of the combined report stages, in pipeline order
+COMBINED_REPORT_STAGES = {
+    'sprint_data': 'Fetching sprint stories',
+    'structured_data': 'Processing Excel data',
+    'sprint_numbers': 'Calculating sprint numbers',
+    'subgoals': 'Generating subgoals',
+    'story_assignments': 'Assigning stories to subgoals',
+    'achievements': 'Generating achievements',
+    'improvement_areas': 'Generating improvement areas',
+    'document': 'Generating combined document'
+}
+
+def build_combined_report(sprint, excel_file, refresh=False, on_progress=None):
+    """Run the combined report pipeline for a sprint and return the Word document."""
+    fetch_stats = new_fetch_stats()
+    
+    def fetch_sprint_data(results):
         # Get sprint stories with all details
-        sprint_stories = get_sprint_stories(jira_client, sprint_id)
-        
-        print("Processing Excel data...")
-        # Process Excel data
-        structured_data = process_excel_data(excel_file)
-        
-        print("Generating sprint data...")
-        # Generate sprint data
+        with jira_pool.client() as jira_client:
+            sprint_stories = load_sprint_stories(jira_client, sprint, fetch_stats, refresh=refresh)
         sprint_data = {
             'sprint_name': sprint.name,
             'sprint_goal': sprint.goal if hasattr(sprint, 'goal') else None,
             'start_date': sprint.startDate,
             'end_date': sprint.endDate,
-            'stories': sprint_stories
+            'stories': to_story_records(sprint_stories)
         }
-        
-        print("Generating subgoals...")
-        # Generate subgoals and achievements
-        subgoals = generate_subgoals(sprint_data['sprint_goal'])
-        
-        print("Assigning stories to subgoals...")
-        story_assignments = assign_stories_to_subgoals(sprint_stories, subgoals)
-        
-        print("Generating achievements...")
-        achievements = generate_achievements(sprint_stories, subgoals)
-        
-        print("Generating improvement areas...")
-        # Generate improvement areas
-        improvement_areas = generate_improvement_areas(structured_data, sprint_data)
-        
-        print("Generating combined document...")
+        return sprint_data
+    
+    def build_document(results):
         try:
             # Generate combined document
-            doc = generate_combined_sprint_doc(
-                sprint_data,
-                improvement_areas,
-                subgoals,
-                story_assignments,
-                    achievements,
-                    structured_data
+            return generate_combined_sprint_doc(
+                results['sprint_data'],
+                results['improvement_areas'],
+                results['subgoals'],
+                results['story_assignments'],
+                results['achievements'],
+                results['structured_data'],
+                results['sprint_numbers']
             )
         except Exception as doc_error:
             print(f"Error in generate_combined_sprint_doc: {str(doc_error)}")
             raise
+    
+    # Each stage starts as soon as the stages it depends on have finished
+    results = run_stage_graph({
+        'sprint_data': ((), fetch_sprint_data),
+        'structured_data': ((), lambda results: process_excel_data(excel_file)),
+        'subgoals': ((), lambda results: generate_subgoals(sprint.goal if hasattr(sprint, 'goal') else None)),
+        'story_assignments': (('sprint_data', 'subgoals'), lambda results: assign_stories_to_subgoals(
+            results['sprint_data']['stories'], results['subgoals'])),
+        'achievements': (('sprint_data', 'subgoals'), lambda results: generate_achievements(
+            results['sprint_data']['stories'], results['subgoals'])),
+        # All numbers of the report come from this one pass over the stories, which
+        # also parses the changelogs for the report exactly once
+        'sprint_numbers': (('sprint_data', 'structured_data'), lambda results: calculate_sprint_numbers(
+            results['sprint_data'], results['structured_data'], build_changelog_index(results['sprint_data']))),
+        'improvement_areas': (('structured_data', 'sprint_data', 'sprint_numbers'), lambda results: generate_improvement_areas(
+            results['structured_data'], results['sprint_data'], results['sprint_numbers'])),
+        'document': (
+            ('sprint_data', 'improvement_areas', 'subgoals', 'story_assignments', 'achievements', 'structured_data',
+             'sprint_numbers'),
+            build_document
+        )
+    }, on_progress=on_progress)
+    return results['document']
+
+def validate_combined_report_request():
+    """Check the combined report form and look up the sprint.
+
+    Returns (sprint, excel_file, None) on success or (None, None, error_response).
+    """
+    try:
+        has_file = 'file' in request.files
+    except RequestEntityTooLarge:
+        return None, None, (jsonify({'error': f"Excel file is larger than {EXCEL_MAX_UPLOAD_MB:g} MB"}), 413)
+    if not has_file:
+        print("No file in request")
+        return None, None, (jsonify({'error': 'No file provided'}), 400)
+    
+    board_id = request.form.get('boardId')
+    sprint_id = request.form.get('sprintId')
+    
+    print(f"Received board_id: {board_id}, sprint_id: {sprint_id}")
+    
+    if not board_id or not sprint_id:
+        print("Missing board_id or sprint_id")
+        return None, None, (jsonify({'error': 'Board ID and Sprint ID are required'}), 400)
+    
+    excel_file = request.files['file']
+    if not excel_file.filename.endswith(('.xlsx', '.xls')):
+        print(f"Invalid file format: {excel_file.filename}")
+        return None, None, (jsonify({'error': 'Invalid file format. Please upload an Excel file.'}), 400)
+    
+    upload_error = check_excel_upload(excel_file)
+    if upload_error:
+        message, status = upload_error
+        print(f"Rejected upload: {message}")
+        return None, None, (jsonify({'error': message}), status)
+    
+    print("Getting Jira client...")
+    # Get sprint details
+    with jira_pool.client() as jira_client:
+        sprint = call_jira_with_backoff(jira_client.sprint, sprint_id)
+    if not sprint:
+        print(f"Sprint not found: {sprint_id}")
+        return None, None, (jsonify({'error': 'Sprint not found'}), 404)
+    
+    return sprint, excel_file, None
+
+@app.route('/api/sprint-combined-report', methods=['POST'])
+def generate_combined_report():
+    try:
+        print("Starting combined report generation...")
+        
+        sprint, excel_file, error_response = validate_combined_report_request()
+        if error_response:
+            return error_response
+        
+        doc = build_combined_report(sprint, excel_file, refresh=request.form.get('refresh') == 'true')
         
         print("Saving document...")
         # Save to BytesIO
@@ -1624,5 +3479,393 @@ def generate_combined_report():
         print(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+# Background report jobs
+REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', '2'))
+REPORT_JOB_RETENTION_SECONDS = float(os.getenv('REPORT_JOB_RETENTION_SECONDS', '3600'))
+
+class ReportJobQueue:
+    """In-process job queue that runs report jobs on a worker pool and tracks stage progress."""
+    
+    def __init__(self, workers, retention_seconds):
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, stages, func):
+        """Queue func(on_progress) and return the new job id.
+
+        func must return a (document bytes, file name) pair.
+        """
+        self._prune()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'stages': {name: 'pending' for name in stages},
+                'stage_labels': dict(stages),
+                'error': None,
+                'created_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'file_name': None
+            }
+            self._executor.submit(self._run, job_id, func)
+        return job_id
+    
+    def _set(self, job_id, **changes):
+        with self._lock:
+            self._jobs[job_id].update(changes)
+    
+    def _set_stage(self, job_id, stage, status):
+        with self._lock:
+            self._jobs[job_id]['stages'][stage] = status
+    
+    def _run(self, job_id, func):
+        self._set(job_id, status='running')
+        try:
+            result, file_name = func(lambda stage, status: self._set_stage(job_id, stage, status))
+            self._set(job_id, status='done', result=result, file_name=file_name, finished_at=time.time())
+        except Exception as e:
+            import traceback
+            print(f"Report job {job_id} failed: {str(e)}")
+            print(traceback.format_exc())
+            self._set(job_id, status='failed', error=str(e), finished_at=time.time())
+    
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job['finished_at'] and job['finished_at'] < cutoff]:
+                del self._jobs[job_id]
+    
+    def status(self, job_id):
+        """Return the public status of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            done = sum(1 for status in job['stages'].values() if status == 'done')
+            return {
+                'job_id': job_id,
+                'status': job['status'],
+                'error': job['error'],
+                'progress': {'completed': done, 'total': len(job['stages'])},
+                'stages': [
+                    {'name': name, 'label': job['stage_labels'][name], 'status': status}
+                    for name, status in job['stages'].items()
+                ]
+            }
+    
+    def result(self, job_id):
+        """Return (document bytes, file name) of a finished job, or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job['status'] != 'done':
+                return None
+            return job['result'], job['file_name']
+
+report_jobs = ReportJobQueue(REPORT_JOB_WORKERS, REPORT_JOB_RETENTION_SECONDS)
+
+@app.route('/api/jobs/sprint-combined-report', methods=['POST'])
+def submit_combined_report_job():
+    try:
+        sprint, excel_file, error_response = validate_combined_report_request()
+        if error_response:
+            return error_response
+        
+        # The upload is gone once this request ends, so keep a copy for the worker
+        excel_copy = io.BytesIO(excel_file.read())
+        excel_copy.filename = excel_file.filename
+        refresh = request.form.get('refresh') == 'true'
+        
+        def run(on_progress):
+            doc = build_combined_report(sprint, excel_copy, refresh=refresh, on_progress=on_progress)
+            doc_io = io.BytesIO()
+            doc.save(doc_io)
+            return doc_io.getvalue(), f'sprint_report_and_analysis_{sprint.name}.docx'
+        
+        job_id = report_jobs.submit(COMBINED_REPORT_STAGES, run)
+        print(f"Queued combined report job {job_id} for sprint {sprint.id}")
+        return jsonify(report_jobs.status(job_id)), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    job = report_jobs.status(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_report_job_result(job_id):
+    job = report_jobs.status(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error']}), 500
+    
+    result = report_jobs.result(job_id)
+    if not result:
+        return jsonify({'error': 'Job has not finished yet', 'status': job['status']}), 409
+    
+    content, file_name = result
+    return send_file(
+        io.BytesIO(content),
+        mimetype='application/zip' if file_name.endswith('.zip') else 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        as_attachment=True,
+        download_name=file_name
+    )
+
+# Cross-sprint trends over a board's most recent closed sprints
+TREND_SPRINT_COUNT = int(os.getenv('TREND_SPRINT_COUNT', '6'))
+TREND_MAX_SPRINTS = int(os.getenv('TREND_MAX_SPRINTS', '50'))
+
+def get_sprint_end(sprint):
+    """The sprint's completion (or planned end) date as a UTC datetime, or None."""
+    return parse_jira_datetime(getattr(sprint, 'completeDate', None) or getattr(sprint, 'endDate', None))
+
+def get_recent_closed_sprints(jira_client, board_id, count, stats=None, refresh=False):
+    """Return the board's last `count` closed sprints with dates, oldest first.
+
+    The sprints come from the cached sprint list, with attribute access like Jira's sprint objects.
+    """
+    sprints = [SimpleNamespace(**sprint) for sprint in get_cached_sprints(jira_client, board_id, refresh, stats)]
+    dated = [
+        sprint for sprint in sprints
+        if sprint.state == 'closed' and sprint.startDate and get_sprint_end(sprint)
+    ]
+    dated.sort(key=get_sprint_end)
+    return dated[-count:] if count else []
+
+def calculate_board_trends(board_id, count=None, refresh=False):
+    """Committed, completed, churn and spillover for the board's last closed sprints as one time series.
+
+    Sprint stories are loaded in parallel, each worker with its own pooled Jira client,
+    and closed sprints come straight from the snapshot cache once they were fetched.
+    The metrics of all sprints are computed together on the columnar frames.
+    """
+    fetch_stats = new_fetch_stats()
+    with jira_pool.client() as jira_client:
+        sprints = get_recent_closed_sprints(jira_client, board_id, count or TREND_SPRINT_COUNT, fetch_stats, refresh)
+    
+    def load(sprint):
+        sprint_stats = new_fetch_stats()
+        with jira_pool.client() as jira_client:
+            stories = load_sprint_stories(jira_client, sprint, sprint_stats, refresh=refresh)
+        return stories, sprint_stats
+    
+    snapshot_cache = {}
+    sprint_data_list = []
+    # Leave one pooled client free so requests served alongside the trends are not starved
+    workers = max(1, JIRA_POOL_SIZE - 1)
+    for sprint, (stories, sprint_stats) in zip(sprints, map_concurrently(load, sprints, workers)):
+        fetch_stats['jira_round_trips'] += sprint_stats['jira_round_trips']
+        outcome = sprint_stats.get('snapshot_cache')
+        snapshot_cache[outcome] = snapshot_cache.get(outcome, 0) + 1
+        sprint_data_list.append({
+            'sprint_name': sprint.name,
+            'start_date': sprint.startDate,
+            'end_date': sprint.endDate,
+            'stories': to_story_records(stories)
+        })
+    
+    metrics = calculate_sprint_frame_metrics(build_sprint_frames(sprint_data_list))['sprints']
+    series = []
+    for sprint, row in zip(sprints, metrics.itertuples()):
+        series.append({
+            'sprint_id': sprint.id,
+            'sprint_name': sprint.name,
+            'start_date': sprint.startDate,
+            'end_date': sprint.endDate,
+            'committed': to_number(row.committed),
+            'completed': to_number(row.completed),
+            'completion_rate': round(row.completed / row.committed * 100, 1) if row.committed else None,
+            'churned_stories': int(row.churned),
+            'churned_points': to_number(row.churned_points),
+            'spilled_stories': int(row.spilled),
+            'spilled_points': to_number(row.spilled_points)
+        })
+    
+    print(f"Computed trends for {len(series)} sprints of board {board_id} in {fetch_stats['jira_round_trips']} Jira round trips")
+    return {
+        'board_id': str(board_id),
+        'sprints': series,
+        'jira_round_trips': fetch_stats['jira_round_trips'],
+        'snapshot_cache': snapshot_cache
+    }
+
+@app.route('/api/boards/<board_id>/trends', methods=['GET'])
+def get_board_trends(board_id):
+    try:
+        try:
+            count = int(request.args.get('count', TREND_SPRINT_COUNT))
+        except ValueError:
+            return jsonify({'error': 'count must be a number'}), 400
+        if count < 1:
+            return jsonify({'error': 'count must be at least 1'}), 400
+        
+        trends = calculate_board_trends(
+            board_id, min(count, TREND_MAX_SPRINTS), refresh=request.args.get('refresh') == 'true'
+        )
+        return jsonify(trends)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Portfolio batch: the last closed sprint report of every board, written to disk
+PORTFOLIO_WORKERS = int(os.getenv('PORTFOLIO_WORKERS', '4'))
+PORTFOLIO_OUTPUT_DIR = os.getenv('PORTFOLIO_OUTPUT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'portfolio_reports'))
+
+def get_all_boards(jira_client, stats=None):
+    """Every board visible to the Jira user, not just the first page."""
+    return call_jira_with_backoff(jira_client.boards, maxResults=False, stats=stats)
+
+def to_file_name(value):
+    """Make a board or sprint name safe to use in a file name."""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('_') or 'unnamed'
+
+def generate_board_report(board, output_dir, refresh=False):
+    """Write the DOCX and JSON report of the board's last closed sprint and return its summary entry."""
+    started = time.time()
+    result = {
+        'board_id': board.id,
+        'board_name': board.name,
+        'status': 'done',
+        'sprint_id': None,
+        'sprint_name': None,
+        'files': [],
+        'error': None,
+        'seconds': None
+    }
+    try:
+        if getattr(board, 'type', 'scrum') != 'scrum':
+            result.update(status='skipped', error=f"{board.type} boards have no sprints")
+            return result
+        
+        with jira_pool.client() as jira_client:
+            sprints = get_recent_closed_sprints(jira_client, board.id, 1, refresh=refresh)
+        if not sprints:
+            result.update(status='skipped', error='No closed sprint found')
+            return result
+        result.update(sprint_id=sprints[0].id, sprint_name=sprints[0].name)
+        
+        report = compute_sprint_report(sprints[0].id, refresh=refresh)
+        if not report:
+            raise Exception(f"Sprint {sprints[0].id} not found")
+        result['sprint_name'] = report['sprint_name']
+        
+        base_name = os.path.join(output_dir, f"{to_file_name(board.name)}-{to_file_name(report['sprint_name'])}-{report['sprint_id']}")
+        render_sprint_report_doc(report).save(base_name + '.docx')
+        with open(base_name + '.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        result['files'] = [os.path.basename(base_name + '.docx'), os.path.basename(base_name + '.json')]
+    except Exception as e:
+        print(f"Portfolio report for board {board.id} failed: {str(e)}")
+        result.update(status='failed', error=str(e))
+    finally:
+        result['seconds'] = round(time.time() - started, 2)
+    return result
+
+def run_portfolio_reports(boards=None, output_dir=None, workers=None, refresh=False, on_progress=None):
+    """Generate the last closed sprint report of every board over a bounded worker pool.
+
+    Boards run PORTFOLIO_WORKERS at a time; their Jira and Gemini calls share the
+    process-wide rate limiters. Reports and a summary.json with per-board timings and
+    failures go to a new timestamped directory under output_dir. Returns the summary.
+    """
+    started = time.time()
+    if boards is None:
+        with jira_pool.client() as jira_client:
+            boards = get_all_boards(jira_client)
+    run_dir = os.path.join(output_dir or PORTFOLIO_OUTPUT_DIR, datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(run_dir, exist_ok=True)
+    print(f"Generating portfolio reports for {len(boards)} boards into {run_dir}")
+    
+    def run(board):
+        if on_progress:
+            on_progress(str(board.id), 'running')
+        result = generate_board_report(board, run_dir, refresh=refresh)
+        if on_progress:
+            on_progress(str(board.id), 'failed' if result['status'] == 'failed' else 'done')
+        print(f"Board {board.id} ({board.name}): {result['status']} in {result['seconds']}s")
+        return result
+    
+    results = map_concurrently(run, boards, PORTFOLIO_WORKERS if workers is None else workers)
+    summary = {
+        'output_dir': run_dir,
+        'boards': len(results),
+        'done': sum(1 for result in results if result['status'] == 'done'),
+        'skipped': sum(1 for result in results if result['status'] == 'skipped'),
+        'failed': sum(1 for result in results if result['status'] == 'failed'),
+        'seconds': round(time.time() - started, 2),
+        'results': results
+    }
+    with open(os.path.join(run_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Portfolio run finished in {summary['seconds']}s: {summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed")
+    return summary
+
+def zip_directory(path):
+    """Zip every file of a directory into memory."""
+    zip_io = io.BytesIO()
+    with zipfile.ZipFile(zip_io, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for file_name in sorted(os.listdir(path)):
+            archive.write(os.path.join(path, file_name), file_name)
+    return zip_io.getvalue()
+
+@app.route('/api/jobs/portfolio-reports', methods=['POST'])
+def submit_portfolio_reports_job():
+    try:
+        with jira_pool.client() as jira_client:
+            boards = get_all_boards(jira_client)
+        
+        board_ids = request.values.get('boardIds')
+        if board_ids:
+            wanted = {board_id.strip() for board_id in board_ids.split(',') if board_id.strip()}
+            boards = [board for board in boards if str(board.id) in wanted]
+        if not boards:
+            return jsonify({'error': 'No boards found'}), 404
+        refresh = request.values.get('refresh') == 'true'
+        
+        def run(on_progress):
+            summary = run_portfolio_reports(boards, refresh=refresh, on_progress=on_progress)
+            return zip_directory(summary['output_dir']), f"portfolio_reports_{os.path.basename(summary['output_dir'])}.zip"
+        
+        job_id = report_jobs.submit({str(board.id): board.name for board in boards}, run)
+        print(f"Queued portfolio report job {job_id} for {len(boards)} boards")
+        return jsonify(report_jobs.status(job_id)), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Jira sprint report backend')
+    parser.add_argument('--benchmark-datetime', action='store_true', help='time the Jira timestamp parser and exit')
+    parser.add_argument('--portfolio', action='store_true', help='write the last closed sprint report of every board and exit')
+    parser.add_argument('--boards', help='comma separated board ids to limit --portfolio to')
+    parser.add_argument('--output-dir', help=f'where --portfolio writes its reports (default {PORTFOLIO_OUTPUT_DIR})')
+    parser.add_argument('--workers', type=int, help=f'boards processed at the same time (default {PORTFOLIO_WORKERS})')
+    parser.add_argument('--refresh', action='store_true', help='reload the sprints from Jira instead of the snapshot cache')
+    args = parser.parse_args()
+    
+    if args.benchmark_datetime:
+        benchmark_parse_jira_datetime()
+    elif args.portfolio:
+        boards = None
+        if args.boards:
+            wanted = {board_id.strip() for board_id in args.boards.split(',')}
+            with jira_pool.client() as jira_client:
+                boards = [board for board in get_all_boards(jira_client) if str(board.id) in wanted]
+        summary = run_portfolio_reports(boards, output_dir=args.output_dir, workers=args.workers, refresh=args.refresh)
+        for result in summary['results']:
+            if result['status'] != 'done':
+                print(f"  {result['board_name']}: {result['status']} - {result['error']}")
+        sys.exit(1 if summary['failed'] else 0)
+    else:
+        app.run(debug=True) 
\ No newline at end of file
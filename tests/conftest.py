@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Keep the on-disk caches of the imported app out of the working tree
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='sprint-report-tests-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2025-05-16T15:38:57.738+0530', datetime(2025, 5, 16, 10, 8, 57, 738000, tzinfo=timezone.utc)),
+    ('2025-05-16T15:38:57.738-0700', datetime(2025, 5, 16, 22, 38, 57, 738000, tzinfo=timezone.utc)),
+    ('2025-05-16T15:38:57.738+05:30', datetime(2025, 5, 16, 10, 8, 57, 738000, tzinfo=timezone.utc)),
+    ('2025-05-16T15:38:57.738Z', datetime(2025, 5, 16, 15, 38, 57, 738000, tzinfo=timezone.utc)),
+    ('2025-05-16T15:38:57.738', datetime(2025, 5, 16, 15, 38, 57, 738000, tzinfo=timezone.utc)),
+    ('2025-05-16T15:38', datetime(2025, 5, 16, 15, 38, tzinfo=timezone.utc)),
+    ('2025-05-16T23:30:00.000-0100', datetime(2025, 5, 17, 0, 30, tzinfo=timezone.utc)),
+])
+def test_parses_offsets_to_utc(value, expected):
+    parsed = app.parse_jira_datetime(value)
+    assert parsed == expected
+    assert parsed.tzinfo == timezone.utc
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    '',
+    'not a date',
+    '2025-02-30T10:00:00.000+0530',
+    '2025-13-01T10:00:00.000Z',
+    '2025-05-16',
+])
+def test_invalid_values_give_none(value):
+    assert app.parse_jira_datetime(value) is None
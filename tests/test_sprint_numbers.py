@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+import app
+
+SPRINT_START = '2025-05-05T10:00:00.000+0530'
+SPRINT_END = '2025-05-15T10:00:00.000+0530'
+
+
+def random_date(rng):
+    offset = rng.choice(['+0530', '-0700', 'Z', ''])
+    return f"2025-05-{rng.randint(1, 20):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00.000{offset}"
+
+
+def random_sprint(rng, name, max_stories=40):
+    stories = []
+    for i in range(rng.randint(0, max_stories)):
+        changelog = []
+        for _ in range(rng.randint(0, 6)):
+            changelog.append({
+                'date': rng.choice([random_date(rng), random_date(rng), random_date(rng), 'not a date']),
+                'author': 'Someone',
+                'field': rng.choice(['Sprint', 'status', 'assignee', 'Story Points']),
+                'from': rng.choice(['S0', name, 'To Do', None]),
+                'to': rng.choice(['Done', name, 'S2', 'In Progress'])
+            })
+        stories.append({
+            'key': f'K-{i}',
+            'summary': f'Story {i}',
+            'description': None,
+            'status': rng.choice(['Done', 'To Do', 'In Progress']),
+            'type': rng.choice(['Story', 'Task', 'Bug']),
+            'priority': 'Medium',
+            'assignee': rng.choice(['Alice', 'Bob', None]),
+            'reporter': 'Carol',
+            'created': random_date(rng),
+            'updated': random_date(rng),
+            'resolution': None,
+            'labels': [],
+            'components': [],
+            'story_points': rng.choice([None, 1, 3, 5, 2.5]),
+            'epic_link': None,
+            'subtasks': [],
+            'changelog': changelog,
+            'comments': [],
+            'blockers': []
+        })
+    return {'sprint_name': name, 'start_date': SPRINT_START, 'end_date': SPRINT_END, 'stories': stories}
+
+
+def reference_numbers(sprint_data):
+    """Straightforward per-story loop with the original committed/completed/churn rules."""
+    start = app.parse_jira_datetime(sprint_data['start_date'])
+    end = app.parse_jira_datetime(sprint_data['end_date'])
+    committed = completed = 0
+    members = {}
+    churned = []
+    for story in sprint_data['stories']:
+        points = story['story_points'] or 0
+        in_start = done = False
+        for change in story['changelog']:
+            date = app.parse_jira_datetime(change['date'])
+            if not date:
+                continue
+            if change['field'] == 'Sprint':
+                if date <= start:
+                    in_start = True
+                if start <= date <= end:
+                    churned.append(story)
+            if change['field'] == 'status' and change['to'] == 'Done' and start <= date <= end:
+                done = True
+        if not any(change['field'] == 'Sprint' for change in story['changelog']):
+            created = app.parse_jira_datetime(story['created'])
+            if created and created <= start:
+                in_start = True
+        committed += points if in_start else 0
+        completed += points if done else 0
+        if story['assignee']:
+            member = members.setdefault(story['assignee'], {'committed': 0, 'completed': 0})
+            member['committed'] += points if in_start else 0
+            member['completed'] += points if done else 0
+    return {
+        'committed': committed,
+        'completed': completed,
+        'members': members,
+        'total_churned': len(churned),
+        'total_churned_points': sum(story['story_points'] for story in churned if story['story_points'])
+    }
+
+
+@pytest.fixture(scope='module')
+def sprints():
+    rng = random.Random(20250505)
+    return [random_sprint(rng, f'S{i}') for i in range(300)]
+
+
+def test_sprint_numbers_match_reference(sprints):
+    for sprint_data in sprints:
+        expected = reference_numbers(sprint_data)
+        numbers = app.calculate_sprint_numbers(sprint_data)
+        assert numbers['committed'] == pytest.approx(expected['committed'])
+        assert numbers['completed'] == pytest.approx(expected['completed'])
+        assert numbers['members'] == expected['members']
+        assert numbers['churn']['total_churned'] == expected['total_churned']
+        assert numbers['churn']['total_churned_points'] == pytest.approx(expected['total_churned_points'])
+
+
+def test_story_records_give_the_same_numbers(sprints):
+    for sprint_data in sprints[:50]:
+        as_dicts = app.calculate_sprint_numbers(sprint_data)
+        as_records = app.calculate_sprint_numbers(dict(sprint_data, stories=app.to_story_records(sprint_data['stories'])))
+        assert as_records == as_dicts
+
+
+def test_sprint_frames_match_sprint_numbers(sprints):
+    results = app.calculate_sprint_frame_metrics(app.build_sprint_frames(sprints))
+    members = {position: group for position, group in results['members'].groupby('sprint')}
+    stories = {position: group for position, group in results['stories'].groupby('sprint')}
+    
+    for position, sprint_data in enumerate(sprints):
+        numbers = app.calculate_sprint_numbers(sprint_data)
+        row = results['sprints'].loc[position]
+        assert row.committed == pytest.approx(numbers['committed'])
+        assert row.completed == pytest.approx(numbers['completed'])
+        assert row.churned == numbers['churn']['total_churned']
+        assert row.churned_points == pytest.approx(numbers['churn']['total_churned_points'])
+        assert row.spilled == numbers['spillover']['total_spilled']
+        assert row.spilled_points == pytest.approx(numbers['spillover']['total_spilled_points'])
+        
+        frame_members = {
+            member.assignee: {'committed': pytest.approx(member.committed), 'completed': pytest.approx(member.completed)}
+            for member in members.get(position, results['members'].iloc[:0]).itertuples()
+        }
+        assert numbers['members'] == frame_members
+        
+        for flags in stories.get(position, results['stories'].iloc[:0]).itertuples():
+            expected = numbers['stories'][flags.key]
+            assert bool(flags.in_sprint_at_start) == expected['in_sprint_at_start']
+            assert bool(flags.completed_during_sprint) == expected['completed_during_sprint']
+            assert (flags.status_at_end if isinstance(flags.status_at_end, str) else None) == expected['status_at_end']
+            assert flags.churn_count == expected['churn_count']
+
+
+def test_given_changelog_index_is_used_and_sprint_data_is_left_alone(sprints):
+    for sprint_data in sprints[:50]:
+        keys = set(sprint_data)
+        index = app.build_changelog_index(sprint_data)
+        assert app.calculate_sprint_numbers(sprint_data, index=index) == app.calculate_sprint_numbers(sprint_data)
+        assert set(sprint_data) == keys